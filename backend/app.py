@@ -1,39 +1,147 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, current_app, g, request, jsonify
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 import os
+import re
+import threading
+import time
+from concurrent.futures import wait
 
-from services.gemini_service import GeminiRecommendationEngine
-from services.spotify_service import SpotifyService
-from models import db, ImportedSong, Recommendation, BuiltPlaylist
+from services.registry import ServiceRegistry
+from services.metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, HTTP_REQUEST_DURATION, record_cache
+from services.tracing import start_trace, end_trace, server_timing_header, log_slow_trace
+from models import db, init_db, DEFAULT_OWNER, ImportedSong, Recommendation
+from store import get_table_version, backfill_dimension_ids, ensure_profiles, load_profile
+from services.taste import TasteProfile
+from services.gemini_service import recommendation_key
+from search_index import RemoteSearch, ensure_search_index, search_local
+from speculation import RecommendationSpeculator
+from sync import build_delta, build_snapshot, current_change_version, playlist_query
+from write_behind import WriteBehindQueue, apply_write
+from pagination import PaginationError, fetch_page, make_etag, parse_fields, parse_filters, parse_limit
+from serializers import FastJSONProvider, IMPORTED_SONG_FIELDS, RECOMMENDATION_FIELDS, serialize_recommendation
+from compression import init_compression
 
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React frontend
+# All API routes live on this blueprint; create_app() registers it under /api
+api = Blueprint('api', __name__, url_prefix='/api')
 
-# Configure SQLite database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///musicai.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Stored data is partitioned by this user or session key (DEFAULT_OWNER without it).
+# The key is a namespace chosen by the client, not an authenticated identity.
+OWNER_HEADER = 'X-User-Id'
+OWNER_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
 
-# Initialize services
-gemini_engine = GeminiRecommendationEngine(api_key=os.getenv('GEMINI_API_KEY'))
-spotify_service = SpotifyService(
-    client_id=os.getenv('SPOTIFY_CLIENT_ID'),
-    client_secret=os.getenv('SPOTIFY_CLIENT_SECRET')
-)
+def get_gemini_engine():
+    """Gemini recommendation engine of the current app (built on first use)"""
+    return current_app.extensions['musicai'].get('gemini_engine')
+
+def get_spotify_service():
+    """Spotify service of the current app (built on first use)"""
+    return current_app.extensions['musicai'].get('spotify_service')
+
+def get_remote_search():
+    """Background Spotify search of the current app (built on first use)"""
+    return current_app.extensions['musicai'].get('remote_search')
+
+def get_speculator():
+    """Speculative recommendation generator of the current app (built on first use)"""
+    return current_app.extensions['musicai'].get('speculator')
+
+def get_write_behind():
+    """Write-behind queue of the current app (built on first use)"""
+    return current_app.extensions['musicai'].get('write_behind')
+
+def persist(operation, payload, on_commit=None):
+    """
+    Apply a store mutation (see write_behind.MUTATIONS) to the request's
+    partition and commit it
+
+    In write-behind mode it is queued for the writer thread instead and
+    on_commit runs once the writer has committed it.
+    """
+    if current_app.config['WRITE_BEHIND']:
+        get_write_behind().submit(g.owner, operation, payload, on_commit)
+    else:
+        apply_write(g.owner, operation, payload, on_commit)
+
+def read_your_writes():
+    """In write-behind mode, wait until the user's writes queued in this worker are committed"""
+    if current_app.config['WRITE_BEHIND']:
+        if not get_write_behind().flush(g.owner, current_app.config['WRITE_BEHIND_FLUSH_WAIT_SECONDS']):
+            print("Warning: write-behind flush timed out, serving possibly stale data")
+
+def speculate_recommendations(owner, songs):
+    """Start generating recommendations for a just-committed import, if enabled"""
+    if not current_app.config['SPECULATIVE_RECOMMENDATIONS']:
+        return
+    try:
+        sample = [song.to_dict() for song in songs[:PROMPT_SONG_SAMPLE]]
+        get_speculator().schedule(owner, sample, load_profile(owner))
+    except Exception as e:
+        print(f"Error scheduling speculative recommendations: {str(e)}")
+
+def attach_speculation(profile):
+    """Use a speculative pool for this playlist (waiting for one in flight), if enabled"""
+    if profile is not None and current_app.config['SPECULATIVE_RECOMMENDATIONS']:
+        get_speculator().prime(profile.fingerprint, current_app.config['SPECULATIVE_WAIT_SECONDS'])
+
+def served_recommendations():
+    """recommendation_key()s of the recommendations currently stored for the request's user"""
+    rows = db.session.execute(
+        db.select(Recommendation.title, Recommendation.artist).where(Recommendation.owner == g.owner)
+    ).all()
+    return {recommendation_key({'title': title, 'artist': artist}) for title, artist in rows}
+
+# Songs listed individually in recommendation prompts
+PROMPT_SONG_SAMPLE = 20
+
+def playlist_profile(songs):
+    """
+    Songs and taste profile for a recommendation or stats request
+    
+    When the request carries the stored imported playlist (same size and
+    fingerprint) the stored profile is used instead of rebuilding one. When
+    it carries no songs, the stored playlist is used: a single row read plus
+    a short sample of songs for the prompt.
+    
+    Returns:
+        Tuple of (songs, profile); profile is None when there are no songs at all
+    """
+    read_your_writes()
+    stored = load_profile(g.owner)
+    if not songs:
+        if not stored.song_count:
+            return [], None
+        rows = db.session.execute(
+            db.select(ImportedSong.title, ImportedSong.artist, ImportedSong.genre,
+                      ImportedSong.tempo, ImportedSong.mood, ImportedSong.energy)
+            .where(ImportedSong.owner == g.owner)
+            .order_by(ImportedSong.created_at, ImportedSong.id)
+            .limit(PROMPT_SONG_SAMPLE)
+        ).all()
+        sample = [{
+            'title': row.title,
+            'artist': row.artist,
+            'genre': row.genre,
+            'tempo': round(row.tempo or 0),
+            'mood': row.mood,
+            'energy': row.energy if row.energy is not None else 0.5
+        } for row in rows]
+        return sample, stored
+    
+    reuse = len(songs) == stored.song_count and TasteProfile.fingerprint_of(songs) == stored.fingerprint
+    record_cache('taste_profile', reuse)
+    return songs, stored if reuse else TasteProfile.from_songs(songs)
 
 # Health check endpoint
-@app.route('/api/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Check if API is running"""
     return jsonify({'status': 'healthy', 'message': 'Backend is running'}), 200
 
 # Import playlist endpoint
-@app.route('/api/import', methods=['POST'])
+@api.route('/import', methods=['POST'])
 def import_playlist():
     """
     Import playlist from Spotify or Apple Music URL
@@ -48,30 +156,16 @@ def import_playlist():
         
         # Determine platform (Spotify or Apple Music)
         if 'spotify.com' in playlist_url:
-            # Extract playlist from Spotify
-            songs = spotify_service.get_playlist_tracks(playlist_url)
+            # Extract playlist from Spotify as compact track records;
+            # dicts are only built while serializing the response
+            songs = get_spotify_service().get_playlist_tracks(playlist_url)
             
             if not songs:
                 return jsonify({'error': 'Failed to fetch playlist or playlist is empty'}), 400
             
-            # Clear existing imported songs
-            ImportedSong.query.delete()
-            
-            # Store songs in database
-            for song in songs:
-                db_song = ImportedSong(
-                    id=song['id'],
-                    title=song['title'],
-                    artist=song['artist'],
-                    album=song.get('album', ''),
-                    genre=song.get('genre', ''),
-                    tempo=song.get('tempo', 0),
-                    mood=song.get('mood', ''),
-                    preview_url=song.get('preview_url', '')
-                )
-                db.session.add(db_song)
-            
-            db.session.commit()
+            # Replace previously imported songs, then speculate on the committed import
+            owner = g.owner
+            persist('import', songs, on_commit=lambda: speculate_recommendations(owner, songs))
                 
             return jsonify({
                 'success': True,
@@ -95,44 +189,32 @@ def import_playlist():
         return jsonify({'error': f'Failed to import playlist: {str(e)}'}), 500
 
 # Generate recommendations endpoint
-@app.route('/api/recommend', methods=['POST'])
+@api.route('/recommend', methods=['POST'])
 def generate_recommendations():
     """
     Generate AI-powered recommendations based on imported songs
     Expected JSON: { "songs": [{id, title, artist, genre, tempo, mood}, ...] }
+    (omit "songs" to use the stored imported playlist)
     """
     try:
-        data = request.get_json()
-        songs = data.get('songs', [])
+        data = request.get_json() or {}
+        songs, profile = playlist_profile(data.get('songs', []))
         
         if not songs:
             return jsonify({'error': 'Songs array is required'}), 400
         
         # Generate recommendations using Gemini AI
-        recommendations = gemini_engine.generate_recommendations(songs)
+        attach_speculation(profile)
+        # Another request for the same playlist moves on to candidates not served yet
+        recommendations = get_gemini_engine().generate_recommendations(
+            songs, profile=profile, exclude=served_recommendations()
+        )
         
         if not recommendations:
             return jsonify({'error': 'Failed to generate recommendations'}), 500
         
-        # Clear existing recommendations
-        Recommendation.query.delete()
-        
-        # Store recommendations in database
-        for rec in recommendations:
-            db_rec = Recommendation(
-                id=rec['id'],
-                title=rec['title'],
-                artist=rec['artist'],
-                album=rec.get('album', ''),
-                genre=rec.get('genre', ''),
-                tempo=rec.get('tempo', 0),
-                mood=rec.get('mood', ''),
-                reason=rec.get('reason', ''),
-                preview_url=rec.get('preview_url', '')
-            )
-            db.session.add(db_rec)
-        
-        db.session.commit()
+        # Replace previously stored recommendations
+        persist('recommend', recommendations)
             
         return jsonify({
             'success': True,
@@ -145,22 +227,24 @@ def generate_recommendations():
         return jsonify({'error': f'Failed to generate recommendations: {str(e)}'}), 500
 
 # Get mood-based recommendations
-@app.route('/api/recommend/mood', methods=['POST'])
+@api.route('/recommend/mood', methods=['POST'])
 def mood_recommendations():
     """
     Generate recommendations filtered by mood
     Expected JSON: { "songs": [...], "mood": "happy|sad|energetic|chill" }
+    (omit "songs" to use the stored imported playlist)
     """
     try:
-        data = request.get_json()
-        songs = data.get('songs', [])
+        data = request.get_json() or {}
+        songs, profile = playlist_profile(data.get('songs', []))
         mood = data.get('mood', 'all')
         
         if not songs:
             return jsonify({'error': 'Songs array is required'}), 400
         
         # Generate mood-specific recommendations
-        recommendations = gemini_engine.generate_mood_recommendations(songs, mood)
+        attach_speculation(profile)
+        recommendations = get_gemini_engine().generate_mood_recommendations(songs, mood, profile=profile)
         
         return jsonify({
             'success': True,
@@ -174,11 +258,16 @@ def mood_recommendations():
         return jsonify({'error': f'Failed to generate mood recommendations: {str(e)}'}), 500
 
 # Search for songs (for adding individual tracks)
-@app.route('/api/search', methods=['GET'])
+@api.route('/search', methods=['GET'])
 def search_songs():
     """
-    Search for songs on Spotify
-    Query params: ?q=song+name+artist
+    Search stored and previously fetched songs, falling back to Spotify
+    Query params: ?q=song+name+artist&limit=10
+    
+    Local full-text hits are returned immediately. When there are fewer than
+    `limit` of them, Spotify is searched in the background and its results
+    are indexed for the next request (remotePending: true). Only when nothing
+    matches locally does the request wait briefly for Spotify.
     """
     try:
         query = request.args.get('q', '')
@@ -186,13 +275,32 @@ def search_songs():
         if not query:
             return jsonify({'error': 'Search query is required'}), 400
         
-        # Search Spotify
-        results = spotify_service.search_tracks(query)
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        state = current_app.extensions['musicai_db']
+        results = search_local(query, limit) if state['search'] else []
+        source = 'local'
+        remote_pending = False
+        
+        if len(results) < limit:
+            future = get_remote_search().submit(query, limit)
+            if future is not None:
+                if not results:
+                    # Nothing to show yet, so it's worth waiting a moment for Spotify
+                    wait([future], timeout=current_app.config['SEARCH_REMOTE_WAIT_SECONDS'])
+                    if future.done():
+                        results, source = future.result()[:limit], 'spotify'
+                remote_pending = not future.done()
         
         return jsonify({
             'success': True,
             'results': results,
-            'count': len(results)
+            'count': len(results),
+            'source': source,
+            'remotePending': remote_pending
         }), 200
         
     except Exception as e:
@@ -200,13 +308,13 @@ def search_songs():
         return jsonify({'error': f'Failed to search songs: {str(e)}'}), 500
 
 # Get song preview URL
-@app.route('/api/preview/<track_id>', methods=['GET'])
+@api.route('/preview/<track_id>', methods=['GET'])
 def get_preview(track_id):
     """
     Get preview URL for a specific track
     """
     try:
-        preview_url = spotify_service.get_track_preview(track_id)
+        preview_url = get_spotify_service().get_track_preview(track_id)
         
         if not preview_url:
             return jsonify({'error': 'Preview not available for this track'}), 404
@@ -221,19 +329,20 @@ def get_preview(track_id):
         return jsonify({'error': f'Failed to get preview: {str(e)}'}), 500
 
 # Calculate discovery stats
-@app.route('/api/stats', methods=['POST'])
+@api.route('/stats', methods=['POST'])
 def calculate_stats():
     """
     Calculate discovery statistics
     Expected JSON: { "originalSongs": [...], "recommendations": [...] }
+    (omit "originalSongs" to compare against the stored imported playlist)
     """
     try:
-        data = request.get_json()
-        original_songs = data.get('originalSongs', [])
+        data = request.get_json() or {}
+        original_songs, profile = playlist_profile(data.get('originalSongs', []))
         recommendations = data.get('recommendations', [])
         
         # Calculate stats
-        stats = gemini_engine.calculate_discovery_stats(original_songs, recommendations)
+        stats = get_gemini_engine().calculate_discovery_stats(original_songs, recommendations, profile=profile)
         
         return jsonify({
             'success': True,
@@ -244,77 +353,76 @@ def calculate_stats():
         print(f"Error calculating stats: {str(e)}")
         return jsonify({'error': f'Failed to calculate stats: {str(e)}'}), 500
 
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'error': 'Endpoint not found'}), 404
+def stored_collection_response(model, columns, key):
+    """
+    Serve a stored collection with keyset pagination, filtering and conditional GET
+    Query params: ?limit=N&cursor=...&fields=id,title,...&genre=&mood=&artist=&tempo_min=&tempo_max=
+    """
+    read_your_writes()
+    # Read the version before the rows: if a write lands in between, the
+    # response carries the older ETag and is simply refetched next time
+    version = get_table_version(g.owner, model.__tablename__)
+    etag = make_etag(g.owner, model.__tablename__, version, request.args)
+    
+    not_modified = request.if_none_match.contains_weak(etag)
+    record_cache('stored_etag', not_modified)
+    
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        fields = parse_fields(request.args.get('fields'), columns)
+        limit = parse_limit(request.args.get('limit'))
+        filters = parse_filters(model, request.args)
+        
+        if filters is None:
+            # Unknown genre/artist: nothing can match
+            items, next_cursor = [], None
+        else:
+            items, next_cursor = fetch_page(
+                model, columns, fields, request.args.get('cursor'), limit, filters, owner=g.owner
+            )
+        
+        body = {'success': True, key: items}
+        if limit:
+            body['nextCursor'] = next_cursor
+        response = jsonify(body)
+    
+    response.set_etag(etag, weak=True)
+    # Let browsers cache the body but always revalidate with If-None-Match
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/api/stored/imported', methods=['GET'])
+@api.route('/stored/imported', methods=['GET'])
 def get_stored_imported_songs():
     """Get stored imported songs"""
     try:
-        songs = ImportedSong.query.all()
-        return jsonify({
-            'success': True,
-            'songs': [{
-                'id': song.id,
-                'title': song.title,
-                'artist': song.artist,
-                'album': song.album,
-                'genre': song.genre,
-                'tempo': song.tempo,
-                'mood': song.mood,
-                'preview_url': song.preview_url
-            } for song in songs]
-        }), 200
+        return stored_collection_response(ImportedSong, IMPORTED_SONG_FIELDS, 'songs')
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error fetching stored songs: {str(e)}")
         return jsonify({'error': f'Failed to fetch stored songs: {str(e)}'}), 500
 
-@app.route('/api/stored/recommendations', methods=['GET'])
+@api.route('/stored/recommendations', methods=['GET'])
 def get_stored_recommendations():
     """Get stored recommendations"""
     try:
-        recommendations = Recommendation.query.all()
-        return jsonify({
-            'success': True,
-            'recommendations': [{
-                'id': rec.id,
-                'title': rec.title,
-                'artist': rec.artist,
-                'album': rec.album,
-                'genre': rec.genre,
-                'tempo': rec.tempo,
-                'mood': rec.mood,
-                'reason': rec.reason,
-                'preview_url': rec.preview_url
-            } for rec in recommendations]
-        }), 200
+        return stored_collection_response(Recommendation, RECOMMENDATION_FIELDS, 'recommendations')
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error fetching stored recommendations: {str(e)}")
         return jsonify({'error': f'Failed to fetch stored recommendations: {str(e)}'}), 500
 
-@app.route('/api/stored/playlist', methods=['GET', 'POST'])
+@api.route('/stored/playlist', methods=['GET', 'POST'])
 def handle_built_playlist():
     """Get or update stored built playlist"""
     if request.method == 'GET':
         try:
-            playlist_items = BuiltPlaylist.query.all()
-            songs = []
-            for item in playlist_items:
-                rec = Recommendation.query.get(item.song_id)
-                if rec:
-                    songs.append({
-                        'id': rec.id,
-                        'title': rec.title,
-                        'artist': rec.artist,
-                        'album': rec.album,
-                        'genre': rec.genre,
-                        'tempo': rec.tempo,
-                        'mood': rec.mood,
-                        'reason': rec.reason,
-                        'preview_url': rec.preview_url
-                    })
+            read_your_writes()
+            # Single join instead of one lookup per playlist item
+            recommendations = playlist_query(g.owner).all()
+            songs = [serialize_recommendation(rec) for rec in recommendations]
             return jsonify({
                 'success': True,
                 'songs': songs
@@ -327,32 +435,284 @@ def handle_built_playlist():
             data = request.get_json()
             songs = data.get('songs', [])
             
-            # Clear existing playlist
-            BuiltPlaylist.query.delete()
-            
-            # Add new songs
-            for song in songs:
-                playlist_item = BuiltPlaylist(
-                    id=f"pl_{song['id']}",
-                    song_id=song['id']
-                )
-                db.session.add(playlist_item)
-            
-            db.session.commit()
+            # Replace the stored playlist
+            persist('built_playlist', songs)
             return jsonify({'success': True}), 200
         except Exception as e:
             print(f"Error updating built playlist: {str(e)}")
             return jsonify({'error': f'Failed to update built playlist: {str(e)}'}), 500
 
-@app.errorhandler(500)
+# Bootstrap endpoint
+@api.route('/bootstrap', methods=['GET'])
+def bootstrap():
+    """
+    All stored state (imported songs, recommendations, built playlist) in one response
+    Query params: ?since=<version> to get only what changed after that version
+    """
+    try:
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return jsonify({'error': 'since must be an integer'}), 400
+        
+        read_your_writes()
+        # Read the version before the rows: a write landing in between is
+        # simply sent again by the next delta
+        version = current_change_version(g.owner)
+        
+        # A version from the future (e.g. the database was recreated) can't be
+        # diffed against, so the client gets everything again
+        if since is None or since > version:
+            return jsonify({'success': True, 'version': version, 'full': True, **build_snapshot(g.owner)}), 200
+        
+        return jsonify({
+            'success': True,
+            'version': version,
+            'full': False,
+            'changes': build_delta(g.owner, since)
+        }), 200
+        
+    except Exception as e:
+        print(f"Error bootstrapping: {str(e)}")
+        return jsonify({'error': f'Failed to load stored data: {str(e)}'}), 500
+
+# Metrics endpoint
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this worker process"""
+    return current_app.response_class(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# Error handlers
+def not_found(error):
+    return jsonify({'error': 'Endpoint not found'}), 404
+
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 # Create database tables before first request and ensure migrations for small schema changes
-@app.before_request
 def create_tables():
-    # Create any missing tables
-    db.create_all()
+    state = current_app.extensions['musicai_db']
+    if not state['ready']:
+        with state['lock']:
+            if not state['ready']:
+                # Create any missing tables, indexes and version rows (once per process)
+                init_db()
+                backfill_dimension_ids()
+                ensure_profiles()
+                db.session.commit()
+                state['search'] = ensure_search_index()
+                state['ready'] = True
+
+# Partition of the request's stored data
+def resolve_owner():
+    owner = request.headers.get(OWNER_HEADER)
+    if owner is None:
+        g.owner = DEFAULT_OWNER
+    elif OWNER_PATTERN.fullmatch(owner):
+        g.owner = owner
+    else:
+        return jsonify({'error': f'{OWNER_HEADER} must be 1-64 letters, digits, "-" or "_"'}), 400
+
+# Per-route latency histogram
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, request.method, route, response.status_code)
+    return response
+
+# Per-request tracing, switchable with the X-Trace header (1/0)
+def begin_request_trace():
+    header = request.headers.get('X-Trace')
+    enabled = current_app.config['TRACE_REQUESTS'] if header is None else header == '1'
+    start_trace(enabled)
+
+def finish_request_trace(response):
+    trace = end_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = server_timing_header(trace)
+        # Expose the timings to the cross-origin React app's Resource Timing API
+        response.headers['Timing-Allow-Origin'] = '*'
+        log_slow_trace(
+            trace,
+            current_app.config['SLOW_REQUEST_THRESHOLD_MS'],
+            method=request.method,
+            path=request.path,
+            status=response.status_code
+        )
+    return response
+
+def clear_request_trace(exc):
+    # Don't leak a trace into the next request handled by this thread
+    end_trace()
+
+def _register_services(app, registry):
+    """
+    Register service factories; SDK imports and client construction happen on first use.
+    Instances passed in config (GEMINI_ENGINE / SPOTIFY_SERVICE) are used as-is.
+    """
+    def make_gemini_engine():
+        from services.gemini_service import GeminiRecommendationEngine
+        return GeminiRecommendationEngine(
+            api_key=app.config['GEMINI_API_KEY'],
+            base_url=app.config['GEMINI_BASE_URL']
+        )
+
+    def make_spotify_service():
+        from services.spotify_service import SpotifyService
+        from services.rate_limit import TokenBucket
+        rate = app.config['SPOTIFY_MAX_REQUESTS_PER_SECOND']
+        rate_limiter = TokenBucket(
+            rate,
+            interactive_reserve=app.config['SPOTIFY_INTERACTIVE_RESERVE'],
+            state_path=app.config['SPOTIFY_RATE_LIMIT_STATE'] or None
+        ) if rate else None
+        return SpotifyService(
+            client_id=app.config['SPOTIFY_CLIENT_ID'],
+            client_secret=app.config['SPOTIFY_CLIENT_SECRET'],
+            api_base_url=app.config['SPOTIFY_API_BASE_URL'],
+            token_url=app.config['SPOTIFY_TOKEN_URL'],
+            rate_limiter=rate_limiter
+        )
+
+    def make_remote_search():
+        return RemoteSearch(app, lambda: registry.get('spotify_service'))
+
+    def make_speculator():
+        return RecommendationSpeculator(
+            app, lambda: registry.get('gemini_engine'),
+            max_workers=app.config['SPECULATIVE_MAX_CONCURRENCY']
+        )
+
+    def make_write_behind():
+        return WriteBehindQueue(app, max_pending=app.config['WRITE_BEHIND_MAX_PENDING'])
+
+    registry.register('gemini_engine', make_gemini_engine)
+    registry.register('spotify_service', make_spotify_service)
+    registry.register('remote_search', make_remote_search)
+    registry.register('speculator', make_speculator)
+    registry.register('write_behind', make_write_behind)
+
+    if app.config.get('GEMINI_ENGINE') is not None:
+        registry.set('gemini_engine', app.config['GEMINI_ENGINE'])
+    if app.config.get('SPOTIFY_SERVICE') is not None:
+        registry.set('spotify_service', app.config['SPOTIFY_SERVICE'])
+
+def warm_up(app) -> threading.Thread:
+    """
+    Warm a freshly forked worker in the background: create tables, open a
+    pooled DB connection, build the service clients and fetch a Spotify token.
+    Requests arriving meanwhile simply initialise whatever is still missing.
+    """
+    def run():
+        # Each step is independent, so one failing (e.g. no Gemini key) still warms the rest
+        with app.app_context():
+            try:
+                create_tables()
+                with db.engine.connect():
+                    pass
+            except Exception as e:
+                print(f"Error warming up database: {str(e)}")
+            try:
+                # Touching the client triggers the deferred SDK import
+                get_gemini_engine().client
+            except Exception as e:
+                print(f"Error warming up Gemini client: {str(e)}")
+            try:
+                spotify = get_spotify_service()
+                if not spotify.access_token:
+                    spotify._get_access_token()
+            except Exception as e:
+                print(f"Error warming up Spotify token: {str(e)}")
+
+    thread = threading.Thread(target=run, name='musicai-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def create_app(config=None):
+    """
+    Application factory
+
+    Args:
+        config: Optional dict of config overrides (e.g. SQLALCHEMY_DATABASE_URI,
+            GEMINI_ENGINE / SPOTIFY_SERVICE test doubles, WARMUP_ON_START,
+            TRACE_REQUESTS, SLOW_REQUEST_THRESHOLD_MS)
+
+    Returns:
+        Configured Flask app. No SDK clients or DB connections are created here.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        # Configure SQLite database
+        SQLALCHEMY_DATABASE_URI=os.getenv('DATABASE_URL', 'sqlite:///musicai.db'),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        GEMINI_API_KEY=os.getenv('GEMINI_API_KEY'),
+        SPOTIFY_CLIENT_ID=os.getenv('SPOTIFY_CLIENT_ID'),
+        SPOTIFY_CLIENT_SECRET=os.getenv('SPOTIFY_CLIENT_SECRET'),
+        # Endpoint overrides, used to point the services at local stubs
+        SPOTIFY_API_BASE_URL=os.getenv('SPOTIFY_API_BASE_URL'),
+        SPOTIFY_TOKEN_URL=os.getenv('SPOTIFY_TOKEN_URL'),
+        GEMINI_BASE_URL=os.getenv('GEMINI_BASE_URL'),
+        # Global Spotify request budget for this process (0 = unlimited)
+        SPOTIFY_MAX_REQUESTS_PER_SECOND=float(os.getenv('SPOTIFY_MAX_REQUESTS_PER_SECOND', '0')),
+        # Share of that budget bulk imports leave free for searches and previews
+        SPOTIFY_INTERACTIVE_RESERVE=float(os.getenv('SPOTIFY_INTERACTIVE_RESERVE', '0.3')),
+        # SQLite file that shares the budget between worker processes ('' = per process)
+        SPOTIFY_RATE_LIMIT_STATE=os.getenv('SPOTIFY_RATE_LIMIT_STATE', ''),
+        WARMUP_ON_START=os.getenv('WARMUP_ON_START', '').lower() in ('1', 'true', 'yes'),
+        TRACE_REQUESTS=os.getenv('TRACE_REQUESTS', '').lower() in ('1', 'true', 'yes'),
+        SLOW_REQUEST_THRESHOLD_MS=float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '2000')),
+        # How long /api/search waits for Spotify when nothing matches locally
+        SEARCH_REMOTE_WAIT_SECONDS=float(os.getenv('SEARCH_REMOTE_WAIT_SECONDS', '3')),
+        # Generate recommendations in the background right after each import
+        SPECULATIVE_RECOMMENDATIONS=os.getenv('SPECULATIVE_RECOMMENDATIONS', '').lower() in ('1', 'true', 'yes'),
+        SPECULATIVE_MAX_CONCURRENCY=int(os.getenv('SPECULATIVE_MAX_CONCURRENCY', '1')),
+        # How long /api/recommend waits on an in-flight speculative generation
+        SPECULATIVE_WAIT_SECONDS=float(os.getenv('SPECULATIVE_WAIT_SECONDS', '60')),
+        # Commit store writes on a background thread after responding
+        WRITE_BEHIND=os.getenv('WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'),
+        # Queued writes before requests fall back to committing synchronously
+        WRITE_BEHIND_MAX_PENDING=int(os.getenv('WRITE_BEHIND_MAX_PENDING', '64')),
+        # How long reads wait for queued writes to be committed
+        WRITE_BEHIND_FLUSH_WAIT_SECONDS=float(os.getenv('WRITE_BEHIND_FLUSH_WAIT_SECONDS', '10')),
+    )
+    if config:
+        app.config.update(config)
+
+    app.json = FastJSONProvider(app)  # orjson-backed jsonify when available
+    # Registered first so the timer wraps every other hook (after_request runs in reverse)
+    app.before_request(start_request_timer)
+    app.after_request(record_request_latency)
+    app.before_request(begin_request_trace)
+    app.after_request(finish_request_trace)
+    app.teardown_request(clear_request_trace)
+    CORS(app)  # Enable CORS for React frontend
+    init_compression(app)  # gzip/brotli for large responses
+    db.init_app(app)
+
+    registry = ServiceRegistry()
+    _register_services(app, registry)
+    app.extensions['musicai'] = registry
+    app.extensions['musicai_db'] = {'ready': False, 'search': False, 'lock': threading.Lock()}
+
+    app.register_blueprint(api)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, internal_error)
+    app.before_request(create_tables)
+    app.before_request(resolve_owner)
+
+    if app.config['WARMUP_ON_START']:
+        warm_up(app)
+
+    return app
+
+# Module-level app for `python app.py` and WSGI servers (gunicorn app:app)
+app = create_app()
 
 if __name__ == '__main__':
     # Check if required environment variables are set
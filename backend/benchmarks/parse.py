@@ -0,0 +1,80 @@
+"""
+Benchmark of the recommendation parse stage on large generations
+
+Times parse_recommendations on stub Gemini outputs (the same pretty-printed
+arrays the stub server returns) of increasing size, plus the rejection of
+truncated and non-JSON outputs. No servers or network involved.
+
+    cd backend
+    python -m benchmarks.parse --items 100,500,2000 --iterations 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.run import percentile
+from benchmarks.stubs import make_recommendations
+from services.recommendation_schema import MalformedResponseError, parse_recommendations
+
+def time_calls(iterations: int, call: Callable[[], object]) -> Dict:
+    latencies = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3)
+    }
+
+def expect_malformed(text: str):
+    try:
+        parse_recommendations(text)
+    except MalformedResponseError:
+        return
+    raise AssertionError('Malformed response was accepted')
+
+def run_suite(sizes: List[int], iterations: int) -> Dict[str, Dict]:
+    results = {}
+    print(f"{'scenario':<28} {'p50 ms':>10} {'p99 ms':>10} {'items':>7}")
+
+    def record(name: str, result: Dict, items: int):
+        results[name] = dict(result, items=items)
+        print(f"{name:<28} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} {items:>7}")
+
+    for size in sizes:
+        text = json.dumps(make_recommendations(size), indent=2)
+        parsed = parse_recommendations(text)
+        if len(parsed) != size:
+            raise AssertionError(f'Parsed {len(parsed)} of {size} recommendations')
+        record(f'parse[{size}]', time_calls(iterations, lambda: parse_recommendations(text)), size)
+
+        # Cut off mid-array, as at the output token limit
+        truncated = text[:len(text) // 2]
+        record(f'parse[{size}] truncated', time_calls(iterations, lambda: expect_malformed(truncated)), 0)
+
+    prose = 'I could not find songs matching this playlist. ' * 20
+    record('parse non-json', time_calls(iterations, lambda: expect_malformed(prose)), 0)
+    return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Recommendation parse stage benchmark')
+    parser.add_argument('--items', default='100,500,2000', help='Comma separated recommendation counts')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.items.split(',') if size]
+    results = run_suite(sizes, args.iterations)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+End-to-end benchmark suite against local Spotify/Gemini stubs
+
+Drives /api/import, /api/recommend, /api/stored/*, /api/search,
+/api/bootstrap and /api/stats through the real Flask stack (in-process test client) while the services talk HTTP
+to stub servers running in a separate process. Reports outbound call counts,
+wall time, p50/p99 latency and peak RSS per scenario, and can fail on
+regressions against a stored baseline.
+
+    cd backend
+    python -m benchmarks.run --sizes 100,1000,10000 --latency-ms 5
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import requests
+
+from benchmarks.stubs import serve
+
+# Latency regressions below this many milliseconds are treated as noise
+LATENCY_SLACK_MS = 2.0
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark for this process (Linux only, best effort)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+class StubProcess:
+    """Stub servers in a child process so they don't skew the app's RSS or CPU"""
+
+    def __init__(self, **options):
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        self.process = context.Process(target=serve, kwargs=dict(options, ready=ready), daemon=True)
+        self.process.start()
+        self.base_url = f'http://127.0.0.1:{ready.get(timeout=30)}'
+
+    def calls(self) -> Dict[str, int]:
+        return requests.get(f'{self.base_url}/__stats').json()
+
+    def reset(self):
+        requests.post(f'{self.base_url}/__reset')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+class Benchmark:
+    """Runs scenarios against one app instance and collects results"""
+
+    def __init__(self, client, stubs: StubProcess):
+        self.client = client
+        self.stubs = stubs
+        self.results: Dict[str, Dict] = {}
+
+    def run(self, name: str, iterations: int, call: Callable[[], object]):
+        """
+        Time `iterations` calls of one scenario
+
+        Args:
+            name: Scenario name (baseline key)
+            iterations: Number of timed calls
+            call: Issues one request and returns the test client response
+        """
+        self.stubs.reset()
+        reset_peak_rss()
+
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            response = call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+        wall = time.perf_counter() - started
+
+        calls = self.stubs.calls()
+        result = {
+            'iterations': iterations,
+            'wall_s': round(wall, 3),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'outbound_calls': round(sum(calls.values()) / iterations, 1),
+            'outbound_by_endpoint': {k: round(v / iterations, 1) for k, v in sorted(calls.items())},
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'errors': errors
+        }
+        self.results[name] = result
+        print(f"{name:<34} {result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f} "
+              f"{result['wall_s']:>8.2f} {result['outbound_calls']:>9.1f} "
+              f"{result['peak_rss_mb']:>8.1f} {errors:>6}")
+        return response
+
+def run_suite(client, stubs: StubProcess, sizes: List[int], iterations: int) -> Dict[str, Dict]:
+    bench = Benchmark(client, stubs)
+    print(f"{'scenario':<34} {'p50 ms':>10} {'p99 ms':>10} {'wall s':>8} {'calls/op':>9} {'rss MiB':>8} {'errors':>6}")
+
+    for size in sizes:
+        # Large imports are slow by design; a single run is enough to spot regressions
+        n = iterations if size < 10000 else 1
+        url = f'https://open.spotify.com/playlist/bench{size}'
+
+        response = bench.run(f'import[{size}]', n, lambda: client.post('/api/import', json={'playlistUrl': url}))
+        songs = (response.get_json() or {}).get('songs', [])
+
+        stored = bench.run(f'stored/imported[{size}]', iterations,
+                           lambda: client.get('/api/stored/imported'))
+        etag = stored.headers.get('ETag')
+        bench.run(f'stored/imported[{size}] 304', iterations,
+                  lambda: client.get('/api/stored/imported', headers={'If-None-Match': etag}))
+        bench.run(f'stored/imported[{size}] page', iterations,
+                  lambda: client.get('/api/stored/imported?limit=100&fields=id,title,artist'))
+
+        response = bench.run(f'recommend[{size}]', iterations,
+                             lambda: client.post('/api/recommend', json={'songs': songs}))
+        recommendations = (response.get_json() or {}).get('recommendations', [])
+
+        bench.run(f'stored/recommendations[{size}]', iterations,
+                  lambda: client.get('/api/stored/recommendations'))
+        bench.run(f'stats[{size}]', iterations,
+                  lambda: client.post('/api/stats', json={'originalSongs': songs, 'recommendations': recommendations}))
+
+        if songs:
+            title = songs[0]['title']
+            bench.run(f'search[{size}] local', iterations,
+                      lambda: client.get('/api/search', query_string={'q': title, 'limit': 1}))
+        # A new query every call, so each one misses the index and waits for Spotify
+        misses = itertools.count()
+        bench.run(f'search[{size}] remote', iterations,
+                  lambda: client.get('/api/search', query_string={'q': f'miss{size}x{next(misses)}'}))
+
+        full = bench.run(f'bootstrap[{size}]', iterations, lambda: client.get('/api/bootstrap'))
+        version = (full.get_json() or {}).get('version', 0)
+
+        playlist = [{'id': rec['id']} for rec in recommendations[:50]]
+        bench.run(f'stored/playlist[{size}] save', iterations,
+                  lambda: client.post('/api/stored/playlist', json={'songs': playlist}))
+        bench.run(f'stored/playlist[{size}]', iterations, lambda: client.get('/api/stored/playlist'))
+        bench.run(f'bootstrap[{size}] delta', iterations,
+                  lambda: client.get('/api/bootstrap', query_string={'since': version}))
+
+    return bench.results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Return human-readable regressions of results against a baseline"""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            limit = base[key] * (1 + tolerance) + LATENCY_SLACK_MS
+            if current[key] > limit:
+                regressions.append(f"{name}: {key} {current[key]} > {limit:.1f} (baseline {base[key]})")
+        if current['outbound_calls'] > base['outbound_calls']:
+            regressions.append(f"{name}: outbound_calls {current['outbound_calls']} > {base['outbound_calls']}")
+        rss_limit = base['peak_rss_mb'] * (1 + tolerance)
+        if current['peak_rss_mb'] > rss_limit:
+            regressions.append(f"{name}: peak_rss_mb {current['peak_rss_mb']} > {rss_limit:.1f}")
+        if current['errors'] > base['errors']:
+            regressions.append(f"{name}: errors {current['errors']} > {base['errors']}")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmarks')
+    parser.add_argument('--sizes', default='100,1000', help='Comma separated playlist sizes (e.g. 100,1000,10000)')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Stub Spotify per-call latency')
+    parser.add_argument('--gemini-latency-ms', type=float, default=0.0, help='Stub Gemini per-call latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub calls that fail')
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    parser.add_argument('--baseline', help='Fail if results regress against this baseline file')
+    parser.add_argument('--save-baseline', help='Write results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    stubs = StubProcess(latency_ms=args.latency_ms, gemini_latency_ms=args.gemini_latency_ms,
+                        error_rate=args.error_rate)
+
+    try:
+        from app import create_app
+
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                'SPOTIFY_CLIENT_ID': 'bench',
+                'SPOTIFY_CLIENT_SECRET': 'bench',
+                'SPOTIFY_API_BASE_URL': f'{stubs.base_url}/v1',
+                'SPOTIFY_TOKEN_URL': f'{stubs.base_url}/api/token',
+                'GEMINI_API_KEY': 'bench',
+                'GEMINI_BASE_URL': stubs.base_url,
+                'WARMUP_ON_START': False
+            })
+            results = run_suite(app.test_client(), stubs, sizes, args.iterations)
+            # Release the SQLite file before the temp dir is removed
+            with app.app_context():
+                from models import db
+                db.engine.dispose()
+    finally:
+        stubs.stop()
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nREGRESSIONS:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('\nNo regressions against baseline')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
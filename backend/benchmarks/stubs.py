@@ -0,0 +1,259 @@
+"""
+Local stand-ins for the Spotify Web API and the Gemini generation API
+
+Only the endpoints SpotifyService and GeminiRecommendationEngine call are
+implemented. Responses are deterministic for a given id so runs are
+comparable. Playlist ids end in their size: 'bench1000' has 1000 tracks.
+
+Run standalone:
+    python -m benchmarks.stubs --port 8765 --latency-ms 20 --error-rate 0.01
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = ['indie rock', 'synthpop', 'hip hop', 'jazz', 'dream pop', 'house', 'folk', 'r&b']
+MOODS = ['Happy', 'Sad', 'Energetic', 'Chill']
+
+def _unit(key: str, salt: str = '') -> float:
+    """Deterministic pseudo-random number in [0, 1) for a key"""
+    digest = hashlib.md5(f'{salt}:{key}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') / 2 ** 32
+
+class StubConfig:
+    """Behaviour knobs shared by all handler threads"""
+
+    def __init__(self, latency_ms: float = 0.0, gemini_latency_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, artists_per_playlist: int = 0):
+        self.latency_ms = latency_ms
+        self.gemini_latency_ms = gemini_latency_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # 0 means one artist per 10 tracks
+        self.artists_per_playlist = artists_per_playlist
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.random = random.Random(42)
+
+    def record(self, endpoint: str):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+def make_track(track_id: str, artist_count: int) -> dict:
+    """Spotify track object for a synthetic track id"""
+    artist_index = int(_unit(track_id, 'artist') * artist_count)
+    return {
+        'id': track_id,
+        'name': f'Track {track_id}',
+        'artists': [{'id': f'artist-{artist_index}', 'name': f'Artist {artist_index}'}],
+        'album': {
+            'name': f'Album {artist_index}',
+            'images': [{'url': f'https://img.example/{track_id}.jpg'}],
+            'release_date': '2020-01-01'
+        },
+        'preview_url': f'https://p.example/{track_id}.mp3',
+        'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+        'popularity': int(_unit(track_id, 'pop') * 100),
+        'explicit': False,
+        'duration_ms': 180000 + int(_unit(track_id, 'dur') * 120000)
+    }
+
+def make_recommendations(count: int) -> list:
+    """Gemini-style recommendation array"""
+    return [{
+        'id': f'rec_{i}',
+        'title': f'Recommended {i}',
+        'artist': f'Rec Artist {i % max(count // 3, 1)}',
+        'genre': GENRES[i % len(GENRES)].title(),
+        'tempo': 80 + (i * 7) % 100,
+        'mood': MOODS[i % len(MOODS)],
+        'reason': 'Shares the playlist\'s tempo and production style',
+        'previewUrl': '#',
+        'matchScore': round(1 - i / (count + 1), 3)
+    } for i in range(count)]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config: StubConfig = None
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _simulate(self, endpoint: str, latency_ms: float) -> bool:
+        """Record the call, sleep, and maybe fail. Returns False if an error was sent."""
+        self.config.record(endpoint)
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        if self.config.should_fail():
+            self._send(self.config.error_status, {'error': {'status': self.config.error_status}})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path
+
+        if path == '/__stats':
+            with self.config.lock:
+                return self._send(200, dict(self.config.calls))
+
+        match = re.fullmatch(r'/v1/playlists/([^/]+)/tracks', path)
+        if match:
+            if not self._simulate('playlist_tracks', self.config.latency_ms):
+                return
+            playlist_id = match.group(1)
+            size_match = re.search(r'(\d+)$', playlist_id)
+            size = int(size_match.group(1)) if size_match else 50
+            artist_count = self.config.artists_per_playlist or max(size // 10, 1)
+            offset = int(params.get('offset', 0))
+            limit = int(params.get('limit', 100))
+            items = [
+                {'track': make_track(f'{playlist_id}-t{i}', artist_count)}
+                for i in range(offset, min(offset + limit, size))
+            ]
+            return self._send(200, {'items': items, 'total': size, 'offset': offset, 'limit': limit})
+
+        match = re.fullmatch(r'/v1/artists/([^/]+)', path)
+        if match:
+            if not self._simulate('artist', self.config.latency_ms):
+                return
+            artist_id = match.group(1)
+            genre = GENRES[int(_unit(artist_id, 'genre') * len(GENRES))]
+            return self._send(200, {'id': artist_id, 'genres': [genre]})
+
+        match = re.fullmatch(r'/v1/audio-features/([^/]+)', path)
+        if match:
+            if not self._simulate('audio_features', self.config.latency_ms):
+                return
+            track_id = match.group(1)
+            return self._send(200, {
+                'id': track_id,
+                'tempo': 70 + _unit(track_id, 'tempo') * 110,
+                'energy': _unit(track_id, 'energy'),
+                'valence': _unit(track_id, 'valence')
+            })
+
+        match = re.fullmatch(r'/v1/tracks/([^/]+)', path)
+        if match:
+            if not self._simulate('track', self.config.latency_ms):
+                return
+            return self._send(200, make_track(match.group(1), 100))
+
+        if path == '/v1/search':
+            if not self._simulate('search', self.config.latency_ms):
+                return
+            query = params.get('q', '')
+            limit = int(params.get('limit', 10))
+            tracks = [make_track(f'search-{query}-{i}', 100) for i in range(limit)]
+            return self._send(200, {'tracks': {'items': tracks}})
+
+        self._send(404, {'error': {'status': 404, 'message': f'No stub for {path}'}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_body()
+
+        if path == '/__reset':
+            with self.config.lock:
+                self.config.calls.clear()
+            return self._send(200, {})
+
+        if path == '/api/token':
+            if not self._simulate('token', self.config.latency_ms):
+                return
+            return self._send(200, {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600})
+
+        match = re.fullmatch(r'/v1beta/models/([^/:]+):generateContent', path)
+        if match:
+            if not self._simulate(f'gemini:{match.group(1)}', self.config.gemini_latency_ms):
+                return
+            request = json.loads(body or b'{}')
+            prompt = ''.join(
+                part.get('text', '')
+                for content in request.get('contents', [])
+                for part in content.get('parts', [])
+            )
+            count_match = re.search(r'recommend (\d+)', prompt)
+            count = int(count_match.group(1)) if count_match else 15
+            text = json.dumps(make_recommendations(count), indent=2)
+            return self._send(200, {
+                'candidates': [{
+                    'content': {'role': 'model', 'parts': [{'text': text}]},
+                    'finishReason': 'STOP'
+                }]
+            })
+
+        self._send(404, {'error': {'status': 404, 'message': f'No stub for {path}'}})
+
+def make_server(config: StubConfig, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Create (but don't start) a stub server; port 0 picks a free port"""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def serve(port: int = 0, ready=None, **options):
+    """
+    Run a stub server forever (target for a benchmark subprocess)
+
+    Args:
+        port: Port to bind, 0 for any free port
+        ready: Optional queue that receives the bound port once listening
+        options: StubConfig keyword arguments
+    """
+    server = make_server(StubConfig(**options), port=port)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run local Spotify/Gemini stub servers')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Per-call Spotify latency')
+    parser.add_argument('--gemini-latency-ms', type=float, default=0.0, help='Per-call Gemini latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    print(f"Stub server on http://127.0.0.1:{args.port}")
+    print(f"  SPOTIFY_API_BASE_URL=http://127.0.0.1:{args.port}/v1")
+    print(f"  SPOTIFY_TOKEN_URL=http://127.0.0.1:{args.port}/api/token")
+    print(f"  GEMINI_BASE_URL=http://127.0.0.1:{args.port}")
+    serve(
+        args.port,
+        latency_ms=args.latency_ms,
+        gemini_latency_ms=args.gemini_latency_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status
+    )
+
+if __name__ == '__main__':
+    main()
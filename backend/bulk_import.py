@@ -0,0 +1,233 @@
+"""
+Bulk import many Spotify playlists into the database
+
+Playlists are fetched concurrently under one global Spotify request budget,
+in the bulk priority class (pass the API's --rate-limit-state file to share
+its budget and stay behind interactive searches), and written in batched
+transactions. Unlike /api/import, existing songs are kept: tracks are
+upserted into the --owner partition (by default the one API requests without
+X-User-Id use). Progress is checkpointed after every committed batch, so an
+interrupted run resumes without re-fetching finished playlists. At most a
+few playlists per worker are fetched ahead of the writer, so memory stays
+bounded by the batch size however long the input file is.
+
+    cd backend
+    python bulk_import.py playlists.txt --workers 8 --rate 20
+    python bulk_import.py playlists.txt            # resume after Ctrl+C
+
+The input file has one playlist URL per line; blank lines and lines
+starting with '#' are ignored.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Dict, List
+
+from app import create_app, create_tables, get_spotify_service
+from models import db, DEFAULT_OWNER
+from services.metrics import DB_WRITE_DURATION
+from store import upsert_imported_songs
+
+DEFAULT_CHECKPOINT = 'bulk_import.checkpoint.json'
+
+# Playlists fetched ahead of the writer, per worker
+FETCH_AHEAD_PER_WORKER = 2
+
+def read_playlist_urls(path: str) -> List[str]:
+    """Read playlist URLs from a file, skipping blanks, comments and duplicates"""
+    urls = []
+    seen = set()
+    with open(path) as f:
+        for line in f:
+            url = line.strip()
+            if url and not url.startswith('#') and url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+class Checkpoint:
+    """
+    Playlists whose tracks are committed, per owner, persisted as JSON
+
+    Imports are stored per owner, so one file can hold the progress of runs
+    for several owners; this instance reads and updates `owner`'s entry.
+    Written atomically (temp file + rename) so a crash mid-write never
+    corrupts the previous checkpoint.
+    """
+
+    def __init__(self, path: str, owner: str = DEFAULT_OWNER):
+        self.path = path
+        self.owner = owner
+        self._owners: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self._owners = data.get('owners', {})
+            if 'done' in data:
+                # Checkpoints written before imports had owners
+                self._owners.setdefault(DEFAULT_OWNER, {'done': data['done'], 'failed': data.get('failed', {})})
+        entry = self._owners.setdefault(owner, {'done': {}, 'failed': {}})
+        self.done: Dict[str, int] = entry['done']
+        self.failed: Dict[str, str] = entry['failed']
+
+    def is_done(self, playlist_id: str) -> bool:
+        return playlist_id in self.done
+
+    def mark_done(self, playlist_id: str, track_count: int):
+        self.done[playlist_id] = track_count
+        self.failed.pop(playlist_id, None)
+
+    def mark_failed(self, playlist_id: str, reason: str):
+        self.failed[playlist_id] = reason
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'owners': self._owners}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+class BulkImporter:
+    """Fetches playlists in a thread pool and writes them from the calling thread"""
+
+    def __init__(self, spotify, checkpoint: Checkpoint, workers: int, batch_size: int, owner: str = DEFAULT_OWNER):
+        self.spotify = spotify
+        self.owner = owner
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.batch_size = batch_size
+        # Fetched but not yet committed: (playlist_id, tracks)
+        self._pending = []
+        self._pending_rows = 0
+        self.imported_tracks = 0
+
+    def flush(self):
+        """Commit pending playlists in one transaction, then checkpoint them"""
+        if not self._pending:
+            return
+
+        tracks = [track for _, playlist_tracks in self._pending for track in playlist_tracks]
+        with DB_WRITE_DURATION.time('bulk_import'):
+            upsert_imported_songs(self.owner, tracks)
+            db.session.commit()
+
+        # Only checkpoint after the commit so a crash can never skip uncommitted playlists
+        for playlist_id, playlist_tracks in self._pending:
+            self.checkpoint.mark_done(playlist_id, len(playlist_tracks))
+        self.checkpoint.save()
+
+        self.imported_tracks += len(tracks)
+        self._pending = []
+        self._pending_rows = 0
+
+    def run(self, urls: List[str]) -> int:
+        """
+        Import every playlist not already in the checkpoint
+
+        Returns:
+            Number of playlists that failed
+        """
+        todo = {}
+        for url in urls:
+            playlist_id = self.spotify._extract_playlist_id(url)
+            if not playlist_id:
+                print(f"Skipping invalid playlist URL: {url}")
+            elif not self.checkpoint.is_done(playlist_id):
+                todo[playlist_id] = url
+
+        skipped = len(urls) - len(todo)
+        print(f"{len(todo)} playlists to import ({skipped} already done or invalid)")
+        if not todo:
+            return 0
+
+        failures = 0
+        completed = 0
+        started = time.perf_counter()
+        queued = iter(todo.items())
+        # Submitted but not yet handled; dropped as soon as handled so fetched
+        # track lists are only referenced from the pending batch
+        inflight: Dict[Future, str] = {}
+        max_inflight = self.workers * FETCH_AHEAD_PER_WORKER
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while True:
+                for playlist_id, url in islice(queued, max_inflight - len(inflight)):
+                    # strict: a failed page fails the playlist instead of truncating it
+                    inflight[executor.submit(self.spotify.get_playlist_tracks, url, True)] = playlist_id
+                if not inflight:
+                    break
+
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    playlist_id = inflight.pop(future)
+                    completed += 1
+                    try:
+                        tracks = future.result()
+                    except Exception as e:
+                        tracks, error = [], str(e)
+                    else:
+                        error = 'empty or unavailable playlist'
+
+                    if tracks:
+                        self._pending.append((playlist_id, tracks))
+                        self._pending_rows += len(tracks)
+                    else:
+                        failures += 1
+                        self.checkpoint.mark_failed(playlist_id, error)
+
+                    if self._pending_rows >= self.batch_size:
+                        self.flush()
+
+                    elapsed = time.perf_counter() - started
+                    print(f"[{completed}/{len(todo)}] {playlist_id}: {len(tracks)} tracks "
+                          f"({elapsed:.1f}s elapsed, {failures} failed)")
+        finally:
+            # On Ctrl+C keep what was already fetched and drop the rest of the queue
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.flush()
+            self.checkpoint.save()
+
+        return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk import Spotify playlists with resumable checkpoints')
+    parser.add_argument('urls_file', help='File with one playlist URL per line')
+    parser.add_argument('--workers', type=int, default=4, help='Playlists fetched concurrently')
+    parser.add_argument('--rate', type=float, default=10.0, help='Global Spotify requests per second')
+    parser.add_argument('--rate-limit-state',
+                        help='Rate limiter state file shared with the API workers (SPOTIFY_RATE_LIMIT_STATE)')
+    parser.add_argument('--batch-size', type=int, default=2000, help='Tracks per database transaction')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='Checkpoint file path')
+    parser.add_argument('--database', help='SQLAlchemy database URI (defaults to the app setting)')
+    parser.add_argument('--owner', default=DEFAULT_OWNER, help='User key (X-User-Id) to import the songs for')
+    args = parser.parse_args(argv)
+
+    config = {'SPOTIFY_MAX_REQUESTS_PER_SECOND': args.rate}
+    if args.rate_limit_state:
+        config['SPOTIFY_RATE_LIMIT_STATE'] = args.rate_limit_state
+    if args.database:
+        config['SQLALCHEMY_DATABASE_URI'] = args.database
+    app = create_app(config)
+
+    urls = read_playlist_urls(args.urls_file)
+    checkpoint = Checkpoint(args.checkpoint, args.owner)
+
+    with app.app_context():
+        create_tables()
+        importer = BulkImporter(get_spotify_service(), checkpoint, args.workers, args.batch_size, args.owner)
+        try:
+            failures = importer.run(urls)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted; progress saved to {args.checkpoint}. Re-run to resume.")
+            return 130
+
+    print(f"Imported {importer.imported_tracks} tracks; {failures} playlists failed "
+          f"(they will be retried on the next run)")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
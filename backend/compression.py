@@ -0,0 +1,69 @@
+"""
+Negotiated gzip/brotli compression for large responses
+
+Brotli is used when the client accepts it and the optional brotli package
+is installed, otherwise gzip. Small bodies are sent as-is since the
+compression overhead outweighs the savings.
+"""
+
+import gzip
+
+from flask import request
+
+from services.tracing import span
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024  # Bytes
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5  # Good ratio for dynamic content without the cost of quality 11
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/csv'}
+
+def choose_encoding(accept_encodings):
+    """Pick the best supported content encoding from the Accept-Encoding header"""
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a response body with the given content encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def init_compression(app):
+    """
+    Register the compression hook on a Flask app
+
+    Config:
+        COMPRESS_MIN_SIZE: Smallest body (bytes) worth compressing
+    """
+    app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough
+                or response.status_code != 200
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        if (response.content_length or 0) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        with span('compress', encoding=encoding):
+            response.set_data(compress_body(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for running the backend with multiple workers
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (cheap: no SDK clients or DB
+connections are created at import) and each forked worker warms itself
+up in the background. WARMUP_ON_START is switched off for the master, so
+warming happens once per worker and never before the fork.
+"""
+
+import os
+
+bind = os.getenv('BIND', '127.0.0.1:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = True
+
+# This file is loaded before the preloaded app is created: keep create_app from
+# warming up the master, whose connections and threads would leak into the workers
+os.environ['WARMUP_ON_START'] = '0'
+
+def post_fork(server, worker):
+    # Connections and tokens must be created after fork, never shared with the master
+    from app import app, warm_up
+    warm_up(app)
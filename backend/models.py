@@ -4,11 +4,41 @@ from datetime import datetime
 
 db = SQLAlchemy()
 
+# Partition of rows written without a user key (requests without X-User-Id,
+# bulk imports, and everything stored before partitioning existed)
+DEFAULT_OWNER = 'default'
+
+def owner_column(primary_key: bool = True):
+    """User or session key leading every partitioned table's keys and indexes"""
+    return db.Column(db.String(64), primary_key=primary_key, nullable=False, default=DEFAULT_OWNER)
+
+class Artist(db.Model):
+    __tablename__ = 'artists'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # NOCASE so lookups from query parameters match regardless of capitalisation
+    name = db.Column(db.String(255, collation='NOCASE'), nullable=False, unique=True)
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100, collation='NOCASE'), nullable=False, unique=True)
+
 class ImportedSong(db.Model):
     __tablename__ = 'imported_songs'
+    __table_args__ = (
+        # Stable sort key used for keyset pagination of /api/stored/imported
+        db.Index('ix_imported_songs_owner_created_at_id', 'owner', 'created_at', 'id'),
+        # Filtered views: equality on genre/mood, range on tempo, then the keyset columns
+        db.Index('ix_imported_songs_owner_genre_mood_tempo', 'owner', 'genre_id', 'mood', 'tempo', 'created_at', 'id'),
+    )
     
+    # Primary key (owner, id): each user's rows are one contiguous key range
+    owner = owner_column()
     id = db.Column(db.String(255), primary_key=True)
     title = db.Column(db.String(255), nullable=False)
+    # artist/genre text is kept alongside genre_id and song_artists so reads need no joins
     artist = db.Column(db.String(255), nullable=False)
     album = db.Column(db.String(255))
     genre = db.Column(db.String(100))
@@ -16,10 +46,18 @@ class ImportedSong(db.Model):
     mood = db.Column(db.String(50))
     preview_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    genre_id = db.Column(db.Integer, db.ForeignKey('genres.id'))
+    energy = db.Column(db.Float)
 
 class Recommendation(db.Model):
     __tablename__ = 'recommendations'
+    __table_args__ = (
+        # Stable sort key used for keyset pagination of /api/stored/recommendations
+        db.Index('ix_recommendations_owner_created_at_id', 'owner', 'created_at', 'id'),
+        db.Index('ix_recommendations_owner_genre_mood_tempo', 'owner', 'genre_id', 'mood', 'tempo', 'created_at', 'id'),
+    )
     
+    owner = owner_column()
     id = db.Column(db.String(255), primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     artist = db.Column(db.String(255), nullable=False)
@@ -31,10 +69,204 @@ class Recommendation(db.Model):
     reason = db.Column(db.Text)
     preview_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    genre_id = db.Column(db.Integer, db.ForeignKey('genres.id'))
 
 class BuiltPlaylist(db.Model):
     __tablename__ = 'built_playlist'
+    __table_args__ = (
+        db.ForeignKeyConstraint(['owner', 'song_id'], ['recommendations.owner', 'recommendations.id']),
+        # Playlist order
+        db.Index('ix_built_playlist_owner_added_at_id', 'owner', 'added_at', 'id'),
+    )
     
+    owner = owner_column()
     id = db.Column(db.String(255), primary_key=True)
-    song_id = db.Column(db.String(255), db.ForeignKey('recommendations.id'))
+    song_id = db.Column(db.String(255))
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SongArtist(db.Model):
+    """
+    One row per artist credited on a stored song, so a collaboration
+    ("A, B") is found when filtering by either artist
+    """
+    __tablename__ = 'song_artists'
+    
+    # The artist filter probes this key once per candidate song in page order
+    owner = owner_column()
+    # imported_songs or recommendations
+    table_name = db.Column(db.String(64), primary_key=True)
+    song_id = db.Column(db.String(255), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), primary_key=True)
+
+class SearchTrack(db.Model):
+    """
+    Every track we have stored or fetched from Spotify, as shown in search results.
+    Content table for the track_search FTS5 index (see search_index.py).
+    """
+    __tablename__ = 'search_tracks'
+    
+    # INTEGER PRIMARY KEY aliases the SQLite rowid, which keys the FTS index
+    id = db.Column(db.Integer, primary_key=True)
+    track_id = db.Column(db.String(255), nullable=False, unique=True)
+    title = db.Column(db.String(255), nullable=False)
+    artist = db.Column(db.String(255), nullable=False)
+    album = db.Column(db.String(255))
+    genre = db.Column(db.String(100))
+    tempo = db.Column(db.Float)
+    mood = db.Column(db.String(50))
+    preview_url = db.Column(db.String(255))
+    spotify_url = db.Column(db.String(255))
+    album_art = db.Column(db.String(255))
+    # imported / spotify
+    source = db.Column(db.String(20))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PlaylistProfile(db.Model):
+    """
+    Persisted TasteProfile (services/taste.py) of a stored song collection,
+    updated by the store write helpers in the same transaction as the songs
+    """
+    __tablename__ = 'playlist_profiles'
+    
+    owner = owner_column()
+    table_name = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CandidatePool(db.Model):
+    """
+    Recommendation candidates generated ahead of time for a playlist,
+    keyed by its taste profile fingerprint (see speculation.py)
+    
+    Not partitioned: the fingerprint identifies the playlist's songs, so
+    users with the same playlist can share its pool.
+    """
+    __tablename__ = 'candidate_pools'
+    
+    fingerprint = db.Column(db.String(16), primary_key=True)
+    candidates = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ChangeLog(db.Model):
+    """
+    Ordered log of changes to the stored collections. A user's newest
+    sequence number is the change version their /api/bootstrap clients sync from.
+    
+    A 'reset' entry (table replaced wholesale) supersedes and removes every
+    earlier entry of its table, so the log only grows with row-level changes.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_owner_seq', 'owner', 'seq'),
+        db.Index('ix_change_log_owner_table_seq', 'owner', 'table_name', 'seq'),
+        # AUTOINCREMENT: sequence numbers are never reused, even after compaction
+        {'sqlite_autoincrement': True},
+    )
+    
+    seq = db.Column(db.Integer, primary_key=True)
+    owner = owner_column(primary_key=False)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.String(255))
+    # upsert / delete / reset
+    op = db.Column(db.String(10), nullable=False)
+
+class TableVersion(db.Model):
+    """
+    Change counter per user and table, bumped in the same transaction as every
+    write. Used to build ETags so unchanged collections can be answered with 304.
+    """
+    __tablename__ = 'table_versions'
+    
+    owner = owner_column()
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def _add_missing_columns():
+    """
+    Add nullable columns introduced after a table was first created.
+    create_all() never alters existing tables, and SQLite supports ADD COLUMN.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present and column.nullable and not column.primary_key:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(db.text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+
+def _partition_legacy_tables():
+    """
+    Rebuild tables created before rows had an owner, moving their rows to
+    DEFAULT_OWNER. SQLite can't change a primary key in place, so each table
+    is renamed, recreated with the owner-leading keys, copied and dropped.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    legacy = [
+        (table, [column['name'] for column in inspector.get_columns(table.name)])
+        for table in db.metadata.sorted_tables
+        if 'owner' in table.columns and table.name in existing_tables
+    ]
+    legacy = [(table, columns) for table, columns in legacy if 'owner' not in columns]
+    if not legacy:
+        return
+    
+    with db.engine.connect() as connection:
+        # Leave foreign keys of other tables pointing at the original table names
+        connection.exec_driver_sql('PRAGMA legacy_alter_table = ON')
+        connection.commit()
+        try:
+            with connection.begin():
+                for table, columns in legacy:
+                    old_name = f'{table.name}_unpartitioned'
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO {old_name}')
+                    # Renamed indexes keep their names; drop them before the new ones are created
+                    old_indexes = connection.exec_driver_sql(
+                        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                        (old_name,)
+                    ).scalars().all()
+                    for index_name in old_indexes:
+                        connection.exec_driver_sql(f'DROP INDEX {index_name}')
+                    
+                    table.create(connection)
+                    copied = ', '.join(column for column in columns if column in table.columns)
+                    connection.exec_driver_sql(
+                        f'INSERT INTO {table.name} (owner, {copied}) SELECT ?, {copied} FROM {old_name}',
+                        (DEFAULT_OWNER,)
+                    )
+                    connection.exec_driver_sql(f'DROP TABLE {old_name}')
+        finally:
+            connection.exec_driver_sql('PRAGMA legacy_alter_table = OFF')
+            connection.commit()
+
+# Indexes earlier versions created that nothing queries any more
+OBSOLETE_INDEXES = (
+    # Artist filters go through song_artists; artist_id held the whole credit string's id
+    'ix_imported_songs_owner_artist_id',
+    'ix_recommendations_owner_artist_id',
+)
+
+def init_db():
+    """
+    Create missing tables, columns and indexes, partitioning tables from
+    before per-user storage. Safe to call repeatedly.
+    """
+    db.create_all()
+    _partition_legacy_tables()
+    _add_missing_columns()
+    
+    # create_all() skips indexes on tables that already exist, so add them explicitly
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    with db.engine.begin() as connection:
+        for index_name in OBSOLETE_INDEXES:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {index_name}')
@@ -0,0 +1,172 @@
+"""
+Keyset pagination, filtering, field projection and ETag helpers for the stored collection endpoints
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from models import db, Artist, Genre, SongArtist
+
+DEFAULT_PAGE_SIZE = None  # No limit unless the client asks for one
+MAX_PAGE_SIZE = 1000
+
+class PaginationError(ValueError):
+    """Raised for malformed pagination query parameters (mapped to HTTP 400)"""
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+def parse_limit(raw: Optional[str]) -> Optional[int]:
+    """Parse the ?limit= parameter, clamped to MAX_PAGE_SIZE"""
+    if raw is None or raw == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+def parse_fields(raw: Optional[str], allowed: Dict) -> List[str]:
+    """
+    Parse the ?fields=a,b,c projection parameter
+
+    Args:
+        raw: Comma separated field names, or None for all fields
+        allowed: Mapping of public field name to model column
+
+    Returns:
+        Ordered list of requested field names
+    """
+    if not raw:
+        return list(allowed)
+
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise PaginationError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def _parse_tempo(raw: Optional[str], name: str) -> Optional[float]:
+    if raw is None or raw == '':
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        raise PaginationError(f'{name} must be a number')
+
+def parse_filters(model, args) -> Optional[list]:
+    """
+    Build indexed filter criteria from query parameters
+
+    Query params: ?genre=Rock&mood=Happy&artist=...&tempo_min=90&tempo_max=130
+
+    Genre and artist names are resolved to their ids first (unique index
+    lookups), so the row scan uses the (genre_id, mood, tempo) index. An
+    artist matches every song crediting it, collaborations included, through
+    the song_artists primary key.
+
+    Returns:
+        List of SQLAlchemy criteria, or None when a named genre/artist doesn't
+        exist (the result is known to be empty without scanning)
+    """
+    criteria = []
+
+    genre = args.get('genre')
+    if genre:
+        genre_id = db.session.execute(db.select(Genre.id).where(Genre.name == genre.strip())).scalar()
+        if genre_id is None:
+            return None
+        criteria.append(model.genre_id == genre_id)
+
+    mood = args.get('mood')
+    if mood:
+        criteria.append(model.mood == mood.strip().title())
+
+    artist = args.get('artist')
+    if artist:
+        artist_id = db.session.execute(db.select(Artist.id).where(Artist.name == artist.strip())).scalar()
+        if artist_id is None:
+            return None
+        criteria.append(db.select(SongArtist.song_id).where(
+            SongArtist.owner == model.owner,
+            SongArtist.table_name == model.__tablename__,
+            SongArtist.song_id == model.id,
+            SongArtist.artist_id == artist_id
+        ).exists())
+
+    tempo_min = _parse_tempo(args.get('tempo_min'), 'tempo_min')
+    tempo_max = _parse_tempo(args.get('tempo_max'), 'tempo_max')
+    if tempo_min is not None:
+        criteria.append(model.tempo >= tempo_min)
+    if tempo_max is not None:
+        criteria.append(model.tempo <= tempo_max)
+
+    return criteria
+
+def fetch_page(model, columns: Dict, fields: List[str], cursor: Optional[str], limit: Optional[int],
+               filters: Optional[list] = None, *, owner: str):
+    """
+    Fetch one page of an owner's collection ordered by the stable key (created_at, id)
+
+    Only the requested columns are selected, so projections never load
+    the full rows. Every index of the collections leads with the owner, so
+    the page is read from that owner's key range only.
+
+    Returns:
+        Tuple of (list of row dictionaries, next cursor or None)
+    """
+    query = db.session.query(
+        model.created_at, model.id, *[columns[name] for name in fields]
+    ).filter(model.owner == owner).order_by(model.created_at, model.id)
+
+    if filters:
+        query = query.filter(*filters)
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at > created_at,
+            and_(model.created_at == created_at, model.id > row_id)
+        ))
+
+    if limit:
+        # Fetch one extra row to know whether another page exists
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+
+    return [dict(zip(fields, row[2:])) for row in rows], next_cursor
+
+def make_etag(owner: str, table_name: str, version: int, args) -> str:
+    """
+    Build the ETag for a collection response
+
+    The owner and table change version identify the data; the query
+    parameters identify the page/projection of it.
+    """
+    params = '&'.join(f"{key}={value}" for key, value in sorted(args.items(multi=True)))
+    params = f"{owner}|{params}"
+    digest = hashlib.sha1(params.encode('utf-8')).hexdigest()[:12]
+    return f"{table_name}-{version}-{digest}"
@@ -0,0 +1,276 @@
+"""
+Local full-text search over every track we have stored or fetched
+
+search_tracks holds one display row per track; the track_search FTS5 table
+indexes its title, artist and album as external content, kept in sync by
+triggers, so writers only ever touch search_tracks. Queries are prefix
+matched per word and ranked with bm25 (title > artist > album).
+
+/api/search answers from this index first. Spotify is only searched in the
+background (RemoteSearch) when there are too few local hits, and its results
+are indexed so the next keystroke finds them locally.
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+from models import db, ImportedSong, SearchTrack
+from services.tracks import TrackRecord
+
+FTS_TABLE = 'track_search'
+
+# bm25 column weights for (title, artist, album)
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Words beyond this are ignored; typeahead queries are short
+MAX_QUERY_TERMS = 8
+
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, artist, album,
+        content='search_tracks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_tracks_ai AFTER INSERT ON search_tracks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_tracks_ad AFTER DELETE ON search_tracks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+    END""",
+    # Upserts rewrite every column; only reindex when the searchable text changed
+    f"""CREATE TRIGGER IF NOT EXISTS search_tracks_au AFTER UPDATE ON search_tracks
+    WHEN old.title IS NOT new.title OR old.artist IS NOT new.artist OR old.album IS NOT new.album BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+        INSERT INTO {FTS_TABLE}(rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END""",
+]
+
+_INDEXED_COLUMNS = ('title', 'artist', 'album', 'genre', 'tempo', 'mood',
+                    'preview_url', 'spotify_url', 'album_art', 'source', 'updated_at')
+
+# Rows per executemany batch
+INDEX_CHUNK_SIZE = 500
+
+def ensure_search_index() -> bool:
+    """
+    Create the FTS5 table and its sync triggers, and index tracks stored
+    before the index existed. Safe to call repeatedly.
+
+    Returns:
+        False when this SQLite build has no FTS5 (search then goes to Spotify only)
+    """
+    inspector = db.inspect(db.engine)
+    created = FTS_TABLE not in inspector.get_table_names()
+    try:
+        with db.engine.begin() as connection:
+            for statement in _FTS_DDL:
+                connection.execute(db.text(statement))
+            if created:
+                # Index any search_tracks rows written while FTS was unavailable
+                connection.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except OperationalError as e:
+        print(f"Full-text search unavailable: {str(e)}")
+        return False
+
+    if db.session.execute(db.select(SearchTrack.id).limit(1)).first() is None:
+        _backfill_search_tracks()
+        db.session.commit()
+    return True
+
+def _backfill_search_tracks():
+    """Index songs imported before search_tracks existed"""
+    rows = db.session.execute(db.select(
+        ImportedSong.id, ImportedSong.title, ImportedSong.artist, ImportedSong.album,
+        ImportedSong.genre, ImportedSong.tempo, ImportedSong.mood, ImportedSong.preview_url
+    )).all()
+    index_tracks(({
+        'track_id': row.id, 'title': row.title, 'artist': row.artist, 'album': row.album,
+        'genre': row.genre, 'tempo': row.tempo, 'mood': row.mood, 'preview_url': row.preview_url
+    } for row in rows), 'imported')
+
+def track_search_row(track: TrackRecord) -> Dict:
+    """search_tracks values for a track record"""
+    return {
+        'track_id': track.id,
+        'title': track.title,
+        'artist': track.artist,
+        'album': track.album,
+        'genre': track.genre,
+        'tempo': track.tempo,
+        'mood': track.mood,
+        'preview_url': track.preview_url,
+        'spotify_url': track.spotify_url,
+        'album_art': track.album_art
+    }
+
+def index_tracks(rows: Iterable[Dict], source: str, overwrite: bool = True):
+    """
+    Add tracks to the search index (does not commit)
+
+    Args:
+        rows: search_tracks values keyed by column name (see track_search_row)
+        source: Where the tracks came from (imported / spotify)
+        overwrite: Update tracks already indexed. Unenriched Spotify search
+            results pass False so they never replace richer imported metadata.
+    """
+    now = datetime.utcnow()
+    batch = []
+
+    def flush():
+        statement = sqlite_insert(SearchTrack)
+        if overwrite:
+            statement = statement.on_conflict_do_update(
+                index_elements=['track_id'],
+                set_={column: statement.excluded[column] for column in _INDEXED_COLUMNS}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=['track_id'])
+        db.session.execute(statement, batch)
+        batch.clear()
+
+    for row in rows:
+        if not row.get('track_id') or not row.get('title'):
+            continue
+        batch.append({column: row.get(column) for column in ('track_id',) + _INDEXED_COLUMNS}
+                     | {'source': source, 'updated_at': now})
+        if len(batch) >= INDEX_CHUNK_SIZE:
+            flush()
+    if batch:
+        flush()
+
+def normalize_query(query: str) -> str:
+    """Lower-cased words of a query joined by single spaces (the dedupe key)"""
+    return ' '.join(re.findall(r'\w+', query.lower())[:MAX_QUERY_TERMS])
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for a free-text query: every word must match
+    as a prefix, so "mich jack" finds "Michael Jackson"
+
+    Returns:
+        None when the query has no searchable words
+    """
+    terms = normalize_query(query).split()
+    if not terms:
+        return None
+    # Quoting keeps words like AND/OR/NEAR literal
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_local(query: str, limit: int) -> List[TrackRecord]:
+    """Best ranked indexed tracks for a query"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    rows = db.session.execute(db.text(f"""
+        SELECT s.track_id, s.title, s.artist, s.album, s.genre, s.tempo, s.mood,
+               s.preview_url, s.spotify_url, s.album_art
+        FROM {FTS_TABLE} JOIN search_tracks s ON s.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :match
+        ORDER BY bm25({FTS_TABLE}, {weights})
+        LIMIT :limit
+    """), {'match': match, 'limit': limit}).all()
+
+    return [TrackRecord(
+        id=row.track_id,
+        title=row.title,
+        artist=row.artist,
+        album=row.album or '',
+        genre=row.genre or 'Unknown',
+        tempo=round(row.tempo) if row.tempo is not None else 120,
+        mood=row.mood or 'Neutral',
+        preview_url=row.preview_url or None,
+        spotify_url=row.spotify_url,
+        album_art=row.album_art or ''
+    ) for row in rows]
+
+class RemoteSearch:
+    """
+    Spotify searches run in the background and indexed on completion
+
+    Concurrent requests for the same normalized query and limit share one
+    in-flight search, and a query whose results were recently indexed is not
+    sent again, so typing never multiplies Spotify calls.
+    """
+
+    # Seconds an indexed remote search suppresses repeats of the same query
+    RECENT_TTL = 300
+    MAX_RECENT = 1000
+
+    def __init__(self, app, get_spotify: Callable, workers: int = 2):
+        """
+        Args:
+            app: Flask app (background searches write through its database)
+            get_spotify: Returns the SpotifyService to search with
+            workers: Concurrent Spotify searches
+        """
+        self.app = app
+        self.get_spotify = get_spotify
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remote-search')
+        # Keyed by (normalized query, limit)
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._recent: Dict[Tuple[str, int], float] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, query: str, limit: int) -> Optional[Future]:
+        """
+        Start (or join) a background Spotify search
+
+        Returns:
+            Future resolving to the list of track records, or None when the
+            query was searched recently and its results are already indexed
+        """
+        key = (normalize_query(query), limit)
+        if not key[0]:
+            return None
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            searched_at = self._recent.get(key)
+            if searched_at is not None and time.monotonic() - searched_at < self.RECENT_TTL:
+                return None
+            future = self._executor.submit(self._search, key)
+            self._inflight[key] = future
+        return future
+
+    def _search(self, key: Tuple[str, int]) -> List[TrackRecord]:
+        query, limit = key
+        tracks = []
+        # Only a search whose results the local index can now answer suppresses
+        # repeats; failures, empty results and builds without FTS5 search again
+        indexed = False
+        try:
+            with self.app.app_context():
+                tracks = self.get_spotify().search_tracks(query, limit, enrich=False)
+                if tracks:
+                    try:
+                        index_tracks((track_search_row(track) for track in tracks), 'spotify', overwrite=False)
+                        db.session.commit()
+                        indexed = self.app.extensions['musicai_db']['search']
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Error indexing search results: {str(e)}")
+        except Exception as e:
+            print(f"Error in background search: {str(e)}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if indexed:
+                    if len(self._recent) >= self.MAX_RECENT:
+                        self._recent.clear()
+                    self._recent[key] = time.monotonic()
+        return tracks
@@ -3,5 +3,6 @@
 
 from .gemini_service import GeminiRecommendationEngine
 from .spotify_service import SpotifyService
+from .tracks import TrackRecord
 
-__all__ = ['GeminiRecommendationEngine', 'SpotifyService']
\ No newline at end of file
+__all__ = ['GeminiRecommendationEngine', 'SpotifyService', 'TrackRecord']
\ No newline at end of file
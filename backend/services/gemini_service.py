@@ -1,7 +1,21 @@
-from google import genai
-from google.genai import types
-import json
-from typing import List, Dict
+import threading
+import time
+from typing import List, Dict, Optional, Set, Tuple
+
+from .metrics import GEMINI_REQUESTS, GEMINI_REQUEST_DURATION, record_cache
+from .recommendation_schema import RESPONSE_SCHEMA, MalformedResponseError, normalize_mood, parse_recommendations
+from .reranking import DEFAULT_DIVERSITY, CandidatePoolCache, mmr_rerank
+from .taste import TasteProfile
+from .tracing import span
+
+# Candidates generated per requested recommendation. The surplus is what the
+# local re-ranking and the mood views choose from, instead of new generations.
+CANDIDATE_POOL_FACTOR = 3
+MAX_CANDIDATE_POOL = 50
+
+def recommendation_key(rec: Dict) -> Tuple[str, str]:
+    """Case-insensitive (title, artist) identity of a recommended song"""
+    return (rec['title'].lower(), rec['artist'].lower())
 
 class GeminiRecommendationEngine:
     """
@@ -9,25 +23,138 @@ class GeminiRecommendationEngine:
     Updated for google-genai (new unified SDK)
     """
     
-    def __init__(self, api_key: str):
-        """Initialize Gemini AI with API key using new SDK"""
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        """
+        Initialize Gemini AI with API key using new SDK
+        
+        Args:
+            api_key: Gemini API key
+            base_url: API endpoint override (e.g. a local stub for benchmarks)
+        """
+        self.api_key = api_key
+        self.base_url = base_url
         self.model_name = 'gemini-2.5-pro'  # Using the stable Gemini Pro model
+        self._client = None
+        self._generation_config = None
+        self._client_lock = threading.Lock()
+        self._pools = CandidatePoolCache()
+        self.diversity = DEFAULT_DIVERSITY
+    
+    @property
+    def client(self):
+        """
+        Gemini SDK client, created on first use
+
+        The google-genai import and client construction are deferred so that
+        building the engine (and importing the app) stays cheap.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google import genai
+                    from google.genai import types
+                    http_options = {'base_url': self.base_url} if self.base_url else None
+                    # Constrain every generation to the recommendation array schema
+                    self._generation_config = types.GenerateContentConfig(
+                        response_mime_type='application/json',
+                        response_schema=RESPONSE_SCHEMA
+                    )
+                    self._client = genai.Client(api_key=self.api_key, http_options=http_options)
+        return self._client
         
-    def generate_recommendations(self, songs: List[Dict], count: int = 15) -> List[Dict]:
+    def _generate(self, prompt: str) -> str:
+        """
+        Run one schema-constrained Gemini generation, recording call count,
+        outcome and latency
+        
+        Returns:
+            The response text (a JSON array, see recommendation_schema)
+        """
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            with span('gemini.generate', model=self.model_name):
+                response = self.client.models.generate_content(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=self._generation_config
+                )
+            status = 'ok'
+            return response.text
+        finally:
+            GEMINI_REQUEST_DURATION.observe(time.perf_counter() - start, self.model_name)
+            GEMINI_REQUESTS.inc(self.model_name, status)
+        
+    def cached_pool(self, fingerprint: str) -> Optional[List[Dict]]:
+        """Candidate pool already generated for a playlist fingerprint, if any"""
+        return self._pools.get(fingerprint)
+    
+    def seed_pool(self, fingerprint: str, pool: List[Dict]):
+        """Install a pool generated elsewhere (another worker, a stored result)"""
+        self._pools.set(fingerprint, pool)
+    
+    def candidate_pool(self, songs: List[Dict], count: int, profile: Optional[TasteProfile] = None) -> List[Dict]:
+        """
+        Recommendation candidates for a playlist, generated once and cached
+        
+        Args:
+            songs: List of song dictionaries with metadata
+            count: Number of recommendations that will be picked from the pool
+            profile: Taste profile of the playlist (built from `songs` if not given);
+                its fingerprint keys the cache
+            
+        Returns:
+            Parsed candidates, CANDIDATE_POOL_FACTOR times `count` when generated
+        """
+        profile = profile or TasteProfile.from_songs(songs)
+        pool = self._pools.get(profile.fingerprint)
+        record_cache('candidate_pool', pool is not None and len(pool) >= count)
+        if pool is None or len(pool) < count:
+            pool = self._dedupe(self._generate_candidates(
+                songs, profile, min(count * CANDIDATE_POOL_FACTOR, MAX_CANDIDATE_POOL)
+            ))
+            if pool:
+                self._pools.set(profile.fingerprint, pool)
+        return pool
+    
+    def generate_recommendations(self, songs: List[Dict], count: int = 15,
+                                 profile: Optional[TasteProfile] = None,
+                                 exclude: Optional[Set[Tuple[str, str]]] = None) -> List[Dict]:
         """
         Generate personalized music recommendations based on playlist
         
+        Picks a diverse `count` from the playlist's candidate pool by
+        maximal marginal relevance, so repeat calls cost no generation.
+        The re-ranking itself is deterministic; repeat calls differ only
+        through `exclude`.
+        
         Args:
             songs: List of song dictionaries with metadata
             count: Number of recommendations to generate (default: 15)
+            profile: Stored taste profile of the playlist, if the caller has one
+            exclude: recommendation_key()s of recommendations already served; skipped
+                while the pool has `count` others, after which it starts over
             
         Returns:
             List of recommended songs with reasons
         """
+        try:
+            pool = self.candidate_pool(songs, count, profile)
+            if exclude:
+                fresh = [rec for rec in pool if recommendation_key(rec) not in exclude]
+                if len(fresh) >= count:
+                    pool = fresh
+            return [dict(rec) for rec in mmr_rerank(pool, count, self.diversity)]
+            
+        except Exception as e:
+            print(f"Error generating recommendations: {str(e)}")
+            return []
+    
+    def _generate_candidates(self, songs: List[Dict], profile: TasteProfile, count: int) -> List[Dict]:
+        """Generate `count` candidates for a playlist in one Gemini call"""
         try:
             # Prepare context from imported songs
-            song_context = self._prepare_song_context(songs)
+            song_context = self._prepare_song_context(songs, profile)
             
             # Create prompt for Gemini
             prompt = f"""You are an expert music recommendation AI. Analyze this playlist and recommend {count} similar songs.
@@ -42,54 +169,83 @@ REQUIREMENTS:
 1. Each recommendation should be a real song (not made up)
 2. Consider: genre similarity, tempo, mood, artist connections, musical era
 3. Provide a specific reason WHY each song fits this playlist
-4. Include diverse recommendations (not all from same artist)
-5. Format as JSON array
-
-OUTPUT FORMAT (strict JSON):
-[
-  {{
-    "id": "unique_id",
-    "title": "Song Title",
-    "artist": "Artist Name",
-    "genre": "Genre",
-    "tempo": 120,
-    "mood": "Happy/Sad/Energetic/Chill",
-    "reason": "Brief explanation why this song fits",
-    "previewUrl": "#"
-  }}
-]
+4. Include diverse recommendations (not all from same artist), covering a range of moods and tempos
+5. Rate how well each song fits the playlist as matchScore, from 0.0 to 1.0"""
 
-Return ONLY the JSON array, no additional text."""
-
-            # Generate recommendations using new SDK
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            
-            # Parse JSON response
-            recommendations = self._parse_recommendations(response.text)
-            
-            return recommendations[:count]
+            # The response schema fixes the output format
+            return parse_recommendations(self._generate(prompt))
             
+        except MalformedResponseError as e:
+            print(f"Malformed recommendation response: {str(e)}")
+            return []
         except Exception as e:
-            print(f"Error generating recommendations: {str(e)}")
+            print(f"Error generating recommendation candidates: {str(e)}")
             return []
     
-    def generate_mood_recommendations(self, songs: List[Dict], mood: str, count: int = 10) -> List[Dict]:
+    def _dedupe(self, candidates: List[Dict]) -> List[Dict]:
+        """Drop repeated songs and make ids unique (they become primary keys when stored)"""
+        unique = []
+        seen_songs = set()
+        seen_ids = set()
+        for rec in candidates:
+            key = recommendation_key(rec)
+            if key in seen_songs:
+                continue
+            seen_songs.add(key)
+            if rec['id'] in seen_ids:
+                rec['id'] = f"rec_{len(seen_ids)}"
+                while rec['id'] in seen_ids:
+                    rec['id'] += '_'
+            seen_ids.add(rec['id'])
+            unique.append(rec)
+        return unique
+    
+    def generate_mood_recommendations(self, songs: List[Dict], mood: str, count: int = 10,
+                                      profile: Optional[TasteProfile] = None) -> List[Dict]:
         """
         Generate recommendations filtered by specific mood
         
+        Filters the playlist's candidate pool locally; Gemini is only asked
+        for this mood specifically when the pool has no song in it.
+        
         Args:
             songs: List of song dictionaries
-            mood: Target mood (happy, sad, energetic, chill)
+            mood: Target mood (happy, sad, energetic, chill, or all)
             count: Number of recommendations
+            profile: Stored taste profile of the playlist, if the caller has one
             
         Returns:
             List of mood-filtered recommendations
         """
         try:
-            song_context = self._prepare_song_context(songs)
+            profile = profile or TasteProfile.from_songs(songs)
+            pool = self.candidate_pool(songs, count, profile)
+            if str(mood).strip().lower() == 'all':
+                matching = pool
+            else:
+                target = normalize_mood(mood)
+                matching = [rec for rec in pool if rec['mood'] == target]
+                if not matching:
+                    matching = [
+                        rec for rec in self._generate_mood_candidates(songs, profile, mood, count)
+                        if rec['mood'] == target
+                    ]
+                    if matching:
+                        # Keep them for later views of the same playlist
+                        merged = self._dedupe(pool + matching)
+                        self._pools.set(profile.fingerprint, merged)
+                        matching = [rec for rec in merged if rec['mood'] == target]
+            
+            return [dict(rec) for rec in mmr_rerank(matching, count, self.diversity)]
+            
+        except Exception as e:
+            print(f"Error generating mood recommendations: {str(e)}")
+            return []
+    
+    def _generate_mood_candidates(self, songs: List[Dict], profile: TasteProfile, mood: str, count: int) -> List[Dict]:
+        """Generate `count` candidates in one mood for a playlist in one Gemini call"""
+        try:
+            song_context = self._prepare_song_context(songs, profile)
             
             prompt = f"""You are an expert music recommendation AI. Based on this playlist, recommend {count} songs with a {mood.upper()} mood.
 
@@ -102,121 +258,80 @@ REQUIREMENTS:
 1. All recommendations must have {mood} mood/energy
 2. Still maintain musical similarity to the playlist
 3. Real songs only (verify they exist)
-4. Explain why each song has this mood
-
-OUTPUT FORMAT (strict JSON):
-[
-  {{
-    "id": "unique_id",
-    "title": "Song Title",
-    "artist": "Artist Name",
-    "genre": "Genre",
-    "tempo": 120,
-    "mood": "{mood.capitalize()}",
-    "reason": "Why this song has {mood} mood and fits the playlist",
-    "previewUrl": "#"
-  }}
-]
+4. Set mood to {normalize_mood(mood)} and explain in the reason why each song has this mood
+5. Rate how well each song fits the playlist as matchScore, from 0.0 to 1.0"""
 
-Return ONLY the JSON array."""
-
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            
-            recommendations = self._parse_recommendations(response.text)
-            
-            return recommendations[:count]
+            return parse_recommendations(self._generate(prompt))[:count]
             
+        except MalformedResponseError as e:
+            print(f"Malformed mood recommendation response: {str(e)}")
+            return []
         except Exception as e:
-            print(f"Error generating mood recommendations: {str(e)}")
+            print(f"Error generating mood candidates: {str(e)}")
             return []
     
-    def calculate_discovery_stats(self, original_songs: List[Dict], recommendations: List[Dict]) -> Dict:
+    def calculate_discovery_stats(self, original_songs: List[Dict], recommendations: List[Dict],
+                                  profile: Optional[TasteProfile] = None) -> Dict:
         """
         Calculate discovery statistics comparing original playlist to recommendations
         
         Args:
             original_songs: Original playlist songs
             recommendations: AI-generated recommendations
+            profile: Stored taste profile of the original songs; its artist
+                histogram replaces a scan of original_songs
             
         Returns:
             Dictionary with discovery statistics
         """
         try:
+            profile = profile or TasteProfile.from_songs(original_songs)
+            
             # Extract unique artists
-            original_artists = {song.get('artist', '') for song in original_songs}
+            original_artists = profile.artists
             recommended_artists = {song.get('artist', '') for song in recommendations}
-            new_artists = recommended_artists - original_artists
+            new_artists = {artist for artist in recommended_artists if artist not in original_artists}
             
             # Calculate percentage of new artists
             new_artists_percentage = (len(new_artists) / len(recommended_artists) * 100) if recommended_artists else 0
             
-            # Genre breakdown
-            genre_counts = {}
-            for song in recommendations:
-                genre = song.get('genre', 'Unknown')
-                genre_counts[genre] = genre_counts.get(genre, 0) + 1
-            
-            # Mood breakdown
-            mood_counts = {}
-            for song in recommendations:
-                mood = song.get('mood', 'Unknown')
-                mood_counts[mood] = mood_counts.get(mood, 0) + 1
-            
-            # Tempo analysis
-            tempos = [song.get('tempo', 0) for song in recommendations if song.get('tempo')]
-            avg_tempo = sum(tempos) / len(tempos) if tempos else 0
+            # Genre and mood breakdown of the recommendations
+            recommended = TasteProfile.from_songs(recommendations)
             
             return {
                 'newArtistsPercentage': round(new_artists_percentage, 1),
                 'newArtistsCount': len(new_artists),
                 'totalRecommendedArtists': len(recommended_artists),
-                'genreBreakdown': genre_counts,
-                'moodBreakdown': mood_counts,
-                'averageTempo': round(avg_tempo),
-                'totalRecommendations': len(recommendations)
+                'genreBreakdown': recommended.genres,
+                'moodBreakdown': recommended.moods,
+                'averageTempo': round(recommended.tempo.mean),
+                'totalRecommendations': len(recommendations),
+                'playlistProfile': profile.summary()
             }
             
         except Exception as e:
             print(f"Error calculating stats: {str(e)}")
             return {}
     
-    def _prepare_song_context(self, songs: List[Dict]) -> str:
+    def _prepare_song_context(self, songs: List[Dict], profile: TasteProfile) -> str:
         """
         Prepare detailed song context for AI prompt
+        
+        The overview comes from the playlist's taste profile; only the first
+        20 songs are listed individually.
         """
         context = ["PLAYLIST ANALYSIS:"]
         
-        # Collect unique genres and moods
-        genres = {}
-        moods = {}
-        total_tempo = 0
-        valid_songs = 0
-        
-        # First pass - collect statistics
-        for song in songs[:20]:  # Limit to first 20 songs for analysis
-            if not isinstance(song, dict):
-                continue
-                
-            genre = song.get('genre', 'Unknown')
-            mood = song.get('mood', 'Unknown')
-            tempo = song.get('tempo', 0)
-            
-            genres[genre] = genres.get(genre, 0) + 1
-            moods[mood] = moods.get(mood, 0) + 1
-            
-            if tempo > 0:
-                total_tempo += tempo
-                valid_songs += 1
-        
         # Add summary statistics
-        avg_tempo = round(total_tempo / valid_songs) if valid_songs > 0 else 0
         context.append("\nPlaylist Overview:")
-        context.append(f"- Dominant Genres: {', '.join(sorted(genres, key=genres.get, reverse=True)[:3])}")
-        context.append(f"- Common Moods: {', '.join(sorted(moods, key=moods.get, reverse=True)[:3])}")
-        context.append(f"- Average Tempo: {avg_tempo} BPM")
+        context.append(f"- Songs: {profile.song_count} by {len(profile.artists)} artists")
+        context.append(f"- Dominant Genres: {', '.join(profile.top(profile.genres, 3))}")
+        context.append(f"- Common Moods: {', '.join(profile.top(profile.moods, 3))}")
+        context.append(f"- Most Frequent Artists: {', '.join(profile.top(profile.artists, 5))}")
+        context.append(f"- Average Tempo: {round(profile.tempo.mean)} BPM (std dev {round(profile.tempo.std)})")
+        if profile.energy.count:
+            context.append(f"- Average Energy: {round(profile.energy.mean * 100)}% "
+                           f"(std dev {round(profile.energy.std * 100)}%)")
         
         # Add individual songs
         context.append("\nSong Details:")
@@ -239,85 +354,3 @@ Return ONLY the JSON array."""
             )
         
         return "\n".join(context)
-    
-    def _parse_recommendations(self, response_text: str) -> List[Dict]:
-        """
-        Parse and validate JSON recommendations from Gemini response
-        """
-        try:
-            # Extract JSON array from response
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            
-            if start_idx == -1 or end_idx == 0:
-                print("No JSON array found in response")
-                return []
-            
-            json_str = response_text[start_idx:end_idx]
-            
-            # Clean up potential formatting issues
-            json_str = json_str.replace('\n', ' ').replace('\r', '')
-            json_str = ' '.join(json_str.split())  # Normalize whitespace
-            
-            recommendations = json.loads(json_str)
-            
-            if not isinstance(recommendations, list):
-                print("Response is not a list")
-                return []
-            
-            # Validate and normalize each recommendation
-            validated_recommendations = []
-            for i, rec in enumerate(recommendations):
-                if not isinstance(rec, dict):
-                    continue
-                    
-                # Required fields check
-                if not all(rec.get(key) for key in ['title', 'artist']):
-                    continue
-                
-                # Normalize and validate fields
-                normalized_rec = {
-                    'id': rec.get('id', f"rec_{i}"),
-                    'title': str(rec['title']).strip(),
-                    'artist': str(rec['artist']).strip(),
-                    'genre': str(rec.get('genre', 'Unknown')).strip(),
-                    'tempo': self._validate_tempo(rec.get('tempo', 120)),
-                    'mood': self._validate_mood(rec.get('mood', 'Neutral')),
-                    'reason': str(rec.get('reason', 'Recommended based on playlist similarity')).strip(),
-                    'previewUrl': rec.get('previewUrl', '#'),
-                    'confidence': float(rec.get('confidence', 0.8)),  # AI confidence in recommendation
-                    'matchScore': float(rec.get('matchScore', 0.7)),  # How well it matches playlist
-                }
-                
-                # Additional validation
-                if len(normalized_rec['title']) < 1 or len(normalized_rec['artist']) < 1:
-                    continue
-                    
-                validated_recommendations.append(normalized_rec)
-            
-            # Sort by match score if available
-            validated_recommendations.sort(key=lambda x: x['matchScore'], reverse=True)
-            
-            return validated_recommendations
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)}")
-            print(f"Response text: {response_text[:500]}")
-            return []
-        except Exception as e:
-            print(f"Error parsing recommendations: {str(e)}")
-            return []
-            
-    def _validate_tempo(self, tempo) -> int:
-        """Validate and normalize tempo value"""
-        try:
-            tempo = int(float(tempo))
-            return max(min(tempo, 300), 40)  # Clamp between 40-300 BPM
-        except (ValueError, TypeError):
-            return 120
-            
-    def _validate_mood(self, mood: str) -> str:
-        """Validate and normalize mood value"""
-        valid_moods = {'Happy', 'Sad', 'Energetic', 'Chill', 'Neutral'}
-        mood = str(mood).strip().title()
-        return mood if mood in valid_moods else 'Neutral'
\ No newline at end of file
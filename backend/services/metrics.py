@@ -0,0 +1,198 @@
+"""
+Minimal in-process metrics with Prometheus text exposition
+
+Counters and histograms are kept per worker process and rendered by
+GET /api/metrics. Every instrumented call site goes through the module
+level metrics defined at the bottom of this file.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+# Latency buckets in seconds, from cache hits up to slow Gemini generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonically increasing counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        # Samples are exposed as <name>_total, and HELP/TYPE must use the same
+        # name or scrapers treat them as untyped (prometheus_client does the same)
+        self.family_name = f'{name}_total'
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        """Increment the counter for the given label values"""
+        key = tuple(str(value) for value in labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(tuple(str(value) for value in labelvalues), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.family_name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Histogram:
+    """Cumulative histogram with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.family_name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        """Record one observation for the given label values"""
+        key = tuple(str(v) for v in labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """Observe the wall time of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(tuple(str(v) for v in labelvalues))
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.family_name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.family_name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'musicai_http_request_duration_seconds',
+    'Latency of API requests by route',
+    ('method', 'route', 'status'))
+
+SPOTIFY_REQUESTS = REGISTRY.counter(
+    'musicai_spotify_requests',
+    'Outbound Spotify API calls by endpoint and HTTP status',
+    ('endpoint', 'status'))
+
+SPOTIFY_REQUEST_DURATION = REGISTRY.histogram(
+    'musicai_spotify_request_duration_seconds',
+    'Latency of outbound Spotify API calls',
+    ('endpoint',))
+
+SPOTIFY_QUEUE_WAIT = REGISTRY.histogram(
+    'musicai_spotify_queue_wait_seconds',
+    'Time outbound Spotify calls spent queued for the rate limiter',
+    ('priority',))
+
+GEMINI_REQUESTS = REGISTRY.counter(
+    'musicai_gemini_requests',
+    'Gemini generation calls by model and outcome',
+    ('model', 'status'))
+
+GEMINI_REQUEST_DURATION = REGISTRY.histogram(
+    'musicai_gemini_request_duration_seconds',
+    'Latency of Gemini generation calls',
+    ('model',))
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'musicai_cache_requests',
+    'Cache lookups by cache and result (hit/miss)',
+    ('cache', 'result'))
+
+DB_WRITE_DURATION = REGISTRY.histogram(
+    'musicai_db_write_duration_seconds',
+    'Time spent writing and committing to the database',
+    ('operation',))
+
+WRITE_BEHIND_WRITES = REGISTRY.counter(
+    'musicai_write_behind_writes',
+    'Store mutations in write-behind mode by operation and path (queued/sync)',
+    ('operation', 'mode'))
+
+def record_cache(cache: str, hit: bool):
+    """Count one cache lookup"""
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
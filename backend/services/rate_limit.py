@@ -0,0 +1,184 @@
+import functools
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Priority classes. Interactive calls (search, preview) serve a user who is
+# waiting; bulk calls (playlist imports) can take as long as they need.
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+_priority: ContextVar[str] = ContextVar('request_priority', default=INTERACTIVE)
+
+# Longest single sleep in acquire(); waiters re-check so priorities and
+# Retry-After pauses set by other threads or processes take effect promptly
+MAX_SLEEP_SECONDS = 0.25
+
+def current_priority() -> str:
+    """Priority class of outbound calls made in the current context"""
+    return _priority.get()
+
+@contextmanager
+def request_priority(priority: str):
+    """Run outbound calls inside the block under a priority class"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def with_priority(priority: str):
+    """Decorator form of request_priority"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_priority(priority):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class SharedBucketState:
+    """
+    Token bucket state in a SQLite file, so every worker process on the host
+    draws from one budget
+
+    Each update runs in a BEGIN IMMEDIATE transaction, which holds the file's
+    write lock across processes. The state is a single tiny row and losing it
+    is harmless, so it is written without fsync.
+    """
+
+    def __init__(self, path: str, capacity: float):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS bucket ('
+            'id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL, updated REAL, blocked_until REAL)'
+        )
+        connection.execute('INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, 0)', (capacity, time.time()))
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA synchronous = OFF')
+            self._local.connection = connection
+        return connection
+
+    def transact(self, update):
+        """
+        Apply update(state) -> (new_state, result) atomically across processes
+
+        State is a (tokens, updated, blocked_until) tuple.
+        """
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            state = connection.execute('SELECT tokens, updated, blocked_until FROM bucket WHERE id = 1').fetchone()
+            state, result = update(state)
+            connection.execute('UPDATE bucket SET tokens = ?, updated = ?, blocked_until = ? WHERE id = 1', state)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return result
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every caller of one service
+
+    Callers block in acquire() until a token is available, so a global
+    request budget turns into queueing instead of upstream 429s.
+
+    Bulk callers never take the last `interactive_reserve` of the bucket and
+    yield while an interactive caller in this process is waiting, so a large
+    import cannot starve searches. With a state_path the budget (and any
+    Retry-After pause) is shared by all processes using the same file.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, interactive_reserve: float = 0.0,
+                 state_path: Optional[str] = None):
+        """
+        Args:
+            rate: Tokens added per second (sustained requests per second)
+            capacity: Maximum burst size (defaults to one second of tokens)
+            interactive_reserve: Fraction of capacity only interactive calls may use
+            state_path: SQLite file holding the bucket state shared across processes
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if not 0 <= interactive_reserve < 1:
+            raise ValueError('interactive_reserve must be in [0, 1)')
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        # Bulk callers must always be able to take at least one token
+        self.reserve = min(self.capacity * interactive_reserve, max(self.capacity - 1, 0))
+        self._state = (self.capacity, time.time(), 0.0)
+        self._shared = SharedBucketState(state_path, self.capacity) if state_path else None
+        self._interactive_waiting = 0
+        self._lock = threading.Lock()
+
+    def _transact(self, update):
+        with self._lock:
+            if self._shared is not None:
+                return self._shared.transact(update)
+            self._state, result = update(self._state)
+            return result
+
+    def try_acquire(self, tokens: float = 1, priority: str = INTERACTIVE) -> float:
+        """
+        Take tokens if available
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds to wait before retrying
+        """
+        if priority == BULK and self._interactive_waiting:
+            return 1 / self.rate
+
+        floor = tokens + (self.reserve if priority == BULK else 0)
+
+        def update(state):
+            available, updated, blocked_until = state
+            now = time.time()
+            if now < blocked_until:
+                return state, blocked_until - now
+            available = min(self.capacity, available + max(now - updated, 0) * self.rate)
+            if available >= floor:
+                return (available - tokens, now, blocked_until), 0.0
+            return (available, now, blocked_until), (floor - available) / self.rate
+
+        return self._transact(update)
+
+    def acquire(self, tokens: float = 1, priority: Optional[str] = None):
+        """Block until the tokens are taken (priority defaults to the current context's)"""
+        priority = priority or current_priority()
+        waiting = False
+        try:
+            while True:
+                wait = self.try_acquire(tokens, priority)
+                if not wait:
+                    return
+                if priority == INTERACTIVE and not waiting:
+                    waiting = True
+                    with self._lock:
+                        self._interactive_waiting += 1
+                time.sleep(min(wait, MAX_SLEEP_SECONDS))
+        finally:
+            if waiting:
+                with self._lock:
+                    self._interactive_waiting -= 1
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for `seconds` (an upstream Retry-After), then
+        restart from an empty bucket so the backlog doesn't burst straight back
+        """
+        def update(state):
+            _, _, blocked_until = state
+            until = max(blocked_until, time.time() + seconds)
+            return (0.0, until, until), None
+
+        self._transact(update)
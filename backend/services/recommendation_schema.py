@@ -0,0 +1,165 @@
+"""
+Response schema and validation of generated recommendations
+
+RESPONSE_SCHEMA is sent with every generation (response_schema), so Gemini
+returns a bare JSON array of these objects. The same schema is compiled once
+into a table of per-field normalizers, and a response is validated in a
+single pass over its items.
+"""
+
+import json
+import math
+from operator import itemgetter
+from typing import Dict, List
+
+try:
+    import orjson
+except ImportError:  # Optional dependency; json decodes the same (see _loads), just slower
+    orjson = None
+
+VALID_MOODS = ['Happy', 'Sad', 'Energetic', 'Chill', 'Neutral']
+
+RESPONSE_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'id': {'type': 'STRING'},
+            'title': {'type': 'STRING'},
+            'artist': {'type': 'STRING'},
+            'genre': {'type': 'STRING'},
+            'tempo': {'type': 'INTEGER', 'minimum': 40, 'maximum': 300},
+            'mood': {'type': 'STRING', 'enum': VALID_MOODS},
+            'reason': {'type': 'STRING'},
+            'matchScore': {'type': 'NUMBER', 'minimum': 0, 'maximum': 1},
+        },
+        'required': ['title', 'artist', 'genre', 'tempo', 'mood', 'reason', 'matchScore'],
+        'propertyOrdering': ['id', 'title', 'artist', 'genre', 'tempo', 'mood', 'reason', 'matchScore'],
+    },
+}
+
+# Used when a field is missing or invalid ('id' falls back to rec_<index>)
+FIELD_DEFAULTS = {
+    'id': None,
+    'title': '',
+    'artist': '',
+    'genre': 'Unknown',
+    'tempo': 120,
+    'mood': 'Neutral',
+    'reason': 'Recommended based on playlist similarity',
+    'matchScore': 0.7,
+}
+
+# Fields every parsed recommendation carries that the model is not asked for
+CONSTANT_FIELDS = {'previewUrl': '#', 'confidence': 0.8}
+
+class MalformedResponseError(ValueError):
+    """The generation is not a JSON array (e.g. truncated, blocked or plain text)"""
+
+def _number(value) -> float:
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f'{value} is not a finite number')
+    return value
+
+def _clamp(convert, low, high):
+    # Bounds in the field's own type, so a clamped matchScore is still a float
+    low = convert(low) if low is not None else None
+    high = convert(high) if high is not None else None
+
+    def normalize(value):
+        value = convert(value)
+        if low is not None:
+            value = max(value, low)
+        if high is not None:
+            value = min(value, high)
+        return value
+    return normalize
+
+def _compile_field(spec: Dict):
+    """Normalizer for one schema property; raises ValueError/TypeError on bad values"""
+    if 'enum' in spec:
+        allowed = {value.lower(): value for value in spec['enum']}
+        return lambda value: allowed[str(value).strip().lower()]
+    if spec['type'] == 'INTEGER':
+        return _clamp(lambda value: int(_number(value)), spec.get('minimum'), spec.get('maximum'))
+    if spec['type'] == 'NUMBER':
+        return _clamp(_number, spec.get('minimum'), spec.get('maximum'))
+    return lambda value: str(value).strip()
+
+# (field, normalizer, default) per schema property, in output order
+FIELDS = tuple(
+    (name, _compile_field(spec), FIELD_DEFAULTS[name])
+    for name, spec in RESPONSE_SCHEMA['items']['properties'].items()
+)
+_normalize_mood = {name: normalize for name, normalize, _ in FIELDS}['mood']
+
+def normalize_mood(mood) -> str:
+    """One of VALID_MOODS, matched case-insensitively ('Neutral' if unknown)"""
+    try:
+        return _normalize_mood(mood)
+    except KeyError:
+        return FIELD_DEFAULTS['mood']
+
+def _finite_float(text: str) -> float:
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f'{text} is out of range')
+    return value
+
+def _reject_constant(name: str):
+    raise ValueError(f'{name} is not valid JSON')
+
+def _loads(text: str):
+    if orjson is not None:
+        return orjson.loads(text)
+    # Strict like orjson: NaN, Infinity and overflowing numbers are errors
+    return json.loads(text, parse_float=_finite_float, parse_constant=_reject_constant)
+
+def parse_recommendations(text: str) -> List[Dict]:
+    """
+    Validate and normalize a generated recommendation array
+
+    Args:
+        text: Response text of a schema-constrained generation
+
+    Returns:
+        Recommendations sorted by matchScore; items without a title or
+        artist are dropped, other invalid fields get their defaults
+
+    Raises:
+        MalformedResponseError: The text is not a JSON array
+    """
+    body = (text or '').strip()
+    # Constrained output is exactly one array, so anything else (an empty or
+    # blocked response, truncation at the token limit) is rejected before decoding
+    if not (body.startswith('[') and body.endswith(']')):
+        raise MalformedResponseError(f'Expected a JSON array, got {body[:80]!r}')
+    try:
+        items = _loads(body)
+    except ValueError as e:
+        raise MalformedResponseError(f'Invalid JSON: {str(e)}') from e
+
+    recommendations = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        rec = {}
+        for name, normalize, default in FIELDS:
+            value = item.get(name)
+            if value is None:
+                rec[name] = default
+                continue
+            try:
+                rec[name] = normalize(value)
+            except (KeyError, TypeError, ValueError):
+                rec[name] = default
+        if not (rec['title'] and rec['artist']):
+            continue
+        if not rec['id']:
+            rec['id'] = f'rec_{i}'
+        rec.update(CONSTANT_FIELDS)
+        recommendations.append(rec)
+
+    recommendations.sort(key=itemgetter('matchScore'), reverse=True)
+    return recommendations
@@ -0,0 +1,47 @@
+import threading
+from typing import Any, Callable, Dict
+
+class ServiceRegistry:
+    """
+    Lazily constructed service singletons for one Flask app
+
+    Services are registered as factories and only built on first use, so
+    importing the app (and forking workers) stays cheap. Tests can replace
+    any service with set() before it is first used.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a zero-argument factory for a service"""
+        self._factories[name] = factory
+
+    def set(self, name: str, instance: Any):
+        """Install a ready-made service instance (e.g. a test double)"""
+        with self._lock:
+            self._instances[name] = instance
+
+    def get(self, name: str) -> Any:
+        """
+        Return a service, constructing it on first use
+
+        Args:
+            name: Registered service name
+
+        Returns:
+            The service instance
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._factories[name]()
+                self._instances[name] = instance
+            return instance
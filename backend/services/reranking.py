@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# numpy module once imported, False if it isn't installed (see _numpy)
+_np = None
+
+# How much each shared feature makes two candidates redundant
+FEATURE_WEIGHTS = {'artist': 0.45, 'genre': 0.25, 'mood': 0.15, 'tempo': 0.15}
+
+# BPM difference at which two tempos stop counting as similar
+TEMPO_SCALE = 40.0
+
+# Trade-off between relevance (matchScore) and novelty: 0 = sort by score only
+DEFAULT_DIVERSITY = 0.3
+
+def _numpy():
+    """
+    numpy, imported on the first re-rank rather than with the app so it
+    doesn't slow down worker startup; None when it isn't installed
+    """
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:  # Optional dependency; the pure Python pass gives the same order
+            numpy = False
+        _np = numpy
+    return _np or None
+
+def _encode(values: List[str]) -> List[int]:
+    """Map case-insensitive category names to small integer codes"""
+    codes = {}
+    return [codes.setdefault(str(value).strip().lower(), len(codes)) for value in values]
+
+def _mmr_numpy(relevance, artist, genre, mood, tempo, count: int, diversity: float) -> List[int]:
+    np = _numpy()
+    relevance = np.asarray(relevance, dtype=float)
+    artist, genre, mood = np.asarray(artist), np.asarray(genre), np.asarray(mood)
+    tempo = np.asarray(tempo, dtype=float)
+
+    max_similarity = np.zeros(len(relevance))
+    available = np.ones(len(relevance), dtype=bool)
+    order = []
+    for _ in range(count):
+        score = np.where(available, (1 - diversity) * relevance - diversity * max_similarity, -np.inf)
+        j = int(np.argmax(score))
+        order.append(j)
+        available[j] = False
+        similarity = (
+            FEATURE_WEIGHTS['artist'] * (artist == artist[j])
+            + FEATURE_WEIGHTS['genre'] * (genre == genre[j])
+            + FEATURE_WEIGHTS['mood'] * (mood == mood[j])
+            + FEATURE_WEIGHTS['tempo'] * np.clip(1 - np.abs(tempo - tempo[j]) / TEMPO_SCALE, 0, 1)
+        )
+        np.maximum(max_similarity, similarity, out=max_similarity)
+    return order
+
+def _mmr_python(relevance, artist, genre, mood, tempo, count: int, diversity: float) -> List[int]:
+    n = len(relevance)
+    max_similarity = [0.0] * n
+    available = set(range(n))
+    order = []
+    for _ in range(count):
+        # min() over indices keeps the first of equal scores, like argmax
+        j = min(available, key=lambda i: (diversity * max_similarity[i] - (1 - diversity) * relevance[i], i))
+        order.append(j)
+        available.discard(j)
+        for i in available:
+            similarity = (
+                FEATURE_WEIGHTS['artist'] * (artist[i] == artist[j])
+                + FEATURE_WEIGHTS['genre'] * (genre[i] == genre[j])
+                + FEATURE_WEIGHTS['mood'] * (mood[i] == mood[j])
+                + FEATURE_WEIGHTS['tempo'] * min(max(1 - abs(tempo[i] - tempo[j]) / TEMPO_SCALE, 0), 1)
+            )
+            if similarity > max_similarity[i]:
+                max_similarity[i] = similarity
+    return order
+
+def mmr_rerank(candidates: List[Dict], count: int, diversity: float = DEFAULT_DIVERSITY) -> List[Dict]:
+    """
+    Pick `count` candidates by maximal marginal relevance
+
+    Each step takes the candidate with the best matchScore after a penalty
+    for its similarity (shared artist, genre, mood, close tempo) to the
+    candidates already picked, so results don't cluster on one artist or tempo.
+
+    Args:
+        candidates: Parsed recommendation dictionaries
+        count: Number of candidates to return
+        diversity: 0 keeps the matchScore order, 1 maximises variety
+
+    Returns:
+        The selected candidates in ranked order
+    """
+    count = min(count, len(candidates))
+    if count <= 0:
+        return []
+
+    relevance = [float(c.get('matchScore', 0.0)) for c in candidates]
+    artist = _encode([c.get('artist', '') for c in candidates])
+    genre = _encode([c.get('genre', '') for c in candidates])
+    mood = _encode([c.get('mood', '') for c in candidates])
+    tempo = [float(c.get('tempo') or 0) for c in candidates]
+
+    select = _mmr_numpy if _numpy() is not None else _mmr_python
+    order = select(relevance, artist, genre, mood, tempo, count, diversity)
+    return [candidates[i] for i in order]
+
+class CandidatePoolCache:
+    """Bounded LRU of generated candidate pools keyed by playlist fingerprint"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._pools: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is not None:
+                self._pools.move_to_end(key)
+            return pool
+
+    def set(self, key: str, pool: List[Dict]):
+        with self._lock:
+            self._pools[key] = pool
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.max_entries:
+                self._pools.popitem(last=False)
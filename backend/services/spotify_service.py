@@ -1,26 +1,121 @@
 import requests
 import base64
+import time
 from typing import List, Dict, Optional
 import re
 
+from .metrics import SPOTIFY_REQUESTS, SPOTIFY_REQUEST_DURATION, SPOTIFY_QUEUE_WAIT, record_cache
+from .tracing import span
+from .tracks import TrackRecord
+from .rate_limit import BULK, INTERACTIVE, TokenBucket, current_priority, with_priority
+
+# Artist genres rarely change; cap the cache so a long-lived worker stays bounded
+ARTIST_GENRE_CACHE_SIZE = 10000
+
+# A 429 is waited out (Retry-After) and retried at most this many times per call
+MAX_RATE_LIMIT_RETRIES = 3
+# Longer Retry-After values are returned to the caller instead of being waited out
+MAX_RETRY_AFTER_SECONDS = 30
+
+class PlaylistFetchError(Exception):
+    """A playlist could not be fetched completely"""
+
 class SpotifyService:
     """
     Service for interacting with Spotify Web API
     """
     
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(self, client_id: str, client_secret: str,
+                 api_base_url: Optional[str] = None, token_url: Optional[str] = None,
+                 rate_limiter: Optional[TokenBucket] = None):
         """
         Initialize Spotify service with credentials
         
         Args:
             client_id: Spotify app client ID
             client_secret: Spotify app client secret
+            api_base_url: Web API base URL override (e.g. a local stub for benchmarks)
+            token_url: Accounts token URL override
+            rate_limiter: Optional token bucket every outbound call waits on,
+                in the priority class of the calling context (interactive by default)
         """
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = None
-        self.token_url = "https://accounts.spotify.com/api/token"
-        self.api_base_url = "https://api.spotify.com/v1"
+        self.token_url = token_url or "https://accounts.spotify.com/api/token"
+        self.api_base_url = api_base_url or "https://api.spotify.com/v1"
+        self._artist_genres: Dict[str, str] = {}
+        self.rate_limiter = rate_limiter
+    
+    def _request(self, method: str, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send an HTTP request to Spotify through the rate limiter
+        
+        A 429 response pauses the shared limiter for its Retry-After, so
+        every queued caller waits it out, and the request is retried.
+        
+        Args:
+            method: HTTP method
+            endpoint: Metric label for the Spotify endpoint (e.g. 'audio_features')
+            url: Full request URL
+            
+        Returns:
+            The requests Response
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            if self.rate_limiter is not None:
+                priority = current_priority()
+                start = time.perf_counter()
+                with span('spotify.rate_limit_wait', priority=priority):
+                    self.rate_limiter.acquire(priority=priority)
+                SPOTIFY_QUEUE_WAIT.observe(time.perf_counter() - start, priority)
+            
+            response = self._send(method, endpoint, url, **kwargs)
+            if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+            
+            retry_after = self._retry_after(response)
+            if retry_after is None:
+                return response
+            if self.rate_limiter is not None:
+                self.rate_limiter.pause(retry_after)
+            else:
+                with span('spotify.retry_after'):
+                    time.sleep(retry_after)
+        return response
+    
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Seconds to wait before retrying a 429, or None if it shouldn't be waited out"""
+        try:
+            seconds = float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            seconds = 1.0
+        return seconds if seconds <= MAX_RETRY_AFTER_SECONDS else None
+    
+    def _send(self, method: str, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """Send one HTTP request, recording call count, status and latency"""
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            with span(f'spotify.{endpoint}'):
+                response = requests.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            SPOTIFY_REQUEST_DURATION.observe(time.perf_counter() - start, endpoint)
+            SPOTIFY_REQUESTS.inc(endpoint, status)
+    
+    def _api_get(self, endpoint: str, url: str, params: Optional[Dict] = None) -> requests.Response:
+        """GET a Web API URL with the current access token"""
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        return self._request('GET', endpoint, url, headers=headers, params=params)
+    
+    def _ensure_access_token(self) -> Optional[str]:
+        """Return the cached access token, fetching one if needed"""
+        record_cache('spotify_token', bool(self.access_token))
+        if not self.access_token:
+            self.access_token = self._get_access_token()
+        return self.access_token
     
     def _get_access_token(self) -> Optional[str]:
         """
@@ -42,7 +137,7 @@ class SpotifyService:
             }
             data = {'grant_type': 'client_credentials'}
             
-            response = requests.post(self.token_url, headers=headers, data=data)
+            response = self._request('POST', 'token', self.token_url, headers=headers, data=data)
             
             if response.status_code == 200:
                 token_data = response.json()
@@ -76,33 +171,38 @@ class SpotifyService:
             print(f"Error extracting playlist ID: {str(e)}")
             return None
     
-    def get_playlist_tracks(self, playlist_url: str) -> List[Dict]:
+    @with_priority(BULK)
+    def get_playlist_tracks(self, playlist_url: str, strict: bool = False) -> List[TrackRecord]:
         """
         Fetch all tracks from a Spotify playlist
         
+        Runs in the bulk priority class so large imports yield to searches.
+        
         Args:
             playlist_url: Full Spotify playlist URL
+            strict: Raise PlaylistFetchError instead of returning the tracks
+                fetched so far when a page (or authentication) fails
             
         Returns:
-            List of song dictionaries with metadata
+            List of track records with metadata
         """
         try:
             # Get access token
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-            
-            if not self.access_token:
+            if not self._ensure_access_token():
+                if strict:
+                    raise PlaylistFetchError('Failed to authenticate with Spotify')
                 print("Failed to authenticate with Spotify")
                 return []
             
             # Extract playlist ID
             playlist_id = self._extract_playlist_id(playlist_url)
             if not playlist_id:
+                if strict:
+                    raise PlaylistFetchError('Invalid playlist URL')
                 print("Invalid playlist URL")
                 return []
             
             # Fetch playlist tracks
-            headers = {'Authorization': f'Bearer {self.access_token}'}
             url = f"{self.api_base_url}/playlists/{playlist_id}/tracks"
             
             songs = []
@@ -111,9 +211,11 @@ class SpotifyService:
             
             while True:
                 params = {'offset': offset, 'limit': limit}
-                response = requests.get(url, headers=headers, params=params)
+                response = self._api_get('playlist_tracks', url, params=params)
                 
                 if response.status_code != 200:
+                    if strict:
+                        raise PlaylistFetchError(f'Tracks page at offset {offset} returned {response.status_code}')
                     print(f"Error fetching tracks: {response.status_code}")
                     break
                 
@@ -142,18 +244,22 @@ class SpotifyService:
             return songs
             
         except Exception as e:
+            if strict:
+                raise
             print(f"Error getting playlist tracks: {str(e)}")
             return []
     
-    def _extract_track_metadata(self, track: Dict) -> Optional[Dict]:
+    def _extract_track_metadata(self, track: Dict, enrich: bool = True) -> Optional[TrackRecord]:
         """
         Extract relevant metadata from Spotify track object
         
         Args:
             track: Spotify track object
+            enrich: Look up audio features and artist genre (two extra
+                requests per uncached track); otherwise defaults are used
             
         Returns:
-            Simplified song dictionary
+            Compact track record
         """
         try:
             if not track or not isinstance(track, dict):
@@ -167,7 +273,7 @@ class SpotifyService:
                 return None
                 
             # Get audio features for tempo and energy
-            audio_features = self._get_audio_features(track_id)
+            audio_features = self._get_audio_features(track_id) if enrich else {}
             
             # Get album images, ensuring we have a valid list
             album_images = track.get('album', {}).get('images', [])
@@ -179,25 +285,24 @@ class SpotifyService:
             artist_str = ', '.join(artist_names) if artist_names else 'Unknown Artist'
             
             # Extract basic info with proper fallbacks
-            song = {
-                'id': track_id,
-                'title': track.get('name', 'Unknown Title').strip(),
-                'artist': artist_str,
-                'albumName': track.get('album', {}).get('name', 'Unknown Album'),
-                'genre': self._get_track_genre(track_id, artists[0].get('id') if artists else None),
-                'tempo': round(float(audio_features.get('tempo', 120))),
-                'mood': self._determine_mood(audio_features),
-                'energy': audio_features.get('energy', 0.5),
-                'previewUrl': track.get('preview_url') or '#',
-                'spotifyUrl': track.get('external_urls', {}).get('spotify', '#'),
-                'albumArt': album_art_url,
-                'popularity': track.get('popularity', 50),
-                'explicit': track.get('explicit', False),
-                'durationMs': track.get('duration_ms', 0),
-                'releaseDate': track.get('album', {}).get('release_date', 'Unknown')
-            }
-            
-            return song
+            album = track.get('album', {})
+            return TrackRecord(
+                id=track_id,
+                title=track.get('name', 'Unknown Title').strip(),
+                artist=artist_str,
+                album=album.get('name', 'Unknown Album'),
+                genre=self._get_track_genre(track_id, artists[0].get('id') if artists else None) if enrich else 'Unknown',
+                tempo=round(float(audio_features.get('tempo', 120))),
+                mood=self._determine_mood(audio_features) if enrich else 'Neutral',
+                energy=audio_features.get('energy', 0.5),
+                preview_url=track.get('preview_url'),
+                spotify_url=track.get('external_urls', {}).get('spotify'),
+                album_art=album_art_url,
+                popularity=track.get('popularity', 50),
+                explicit=track.get('explicit', False),
+                duration_ms=track.get('duration_ms', 0),
+                release_date=album.get('release_date', 'Unknown')
+            )
             
         except Exception as e:
             print(f"Error extracting track metadata: {str(e)}")
@@ -208,20 +313,28 @@ class SpotifyService:
         try:
             if not artist_id:
                 return 'Unknown'
+            
+            cached = self._artist_genres.get(artist_id)
+            record_cache('artist_genre', cached is not None)
+            if cached is not None:
+                return cached
                 
-            headers = {'Authorization': f'Bearer {self.access_token}'}
             url = f"{self.api_base_url}/artists/{artist_id}"
             
-            response = requests.get(url, headers=headers)
+            response = self._api_get('artist', url)
             
-            if response.status_code == 200:
-                artist_data = response.json()
-                genres = artist_data.get('genres', [])
-                if genres:
-                    # Return first genre, capitalized
-                    return genres[0].title()
+            if response.status_code != 200:
+                # Don't cache failures; the next lookup retries
+                return 'Unknown'
             
-            return 'Unknown'
+            genres = response.json().get('genres', [])
+            # Return first genre, capitalized
+            genre = genres[0].title() if genres else 'Unknown'
+            
+            if len(self._artist_genres) >= ARTIST_GENRE_CACHE_SIZE:
+                self._artist_genres.clear()
+            self._artist_genres[artist_id] = genre
+            return genre
             
         except Exception as e:
             print(f"Error getting track genre: {str(e)}")
@@ -238,10 +351,9 @@ class SpotifyService:
             Audio features dictionary
         """
         try:
-            headers = {'Authorization': f'Bearer {self.access_token}'}
             url = f"{self.api_base_url}/audio-features/{track_id}"
             
-            response = requests.get(url, headers=headers)
+            response = self._api_get('audio_features', url)
             
             if response.status_code == 200:
                 return response.json()
@@ -279,26 +391,24 @@ class SpotifyService:
             print(f"Error determining mood: {str(e)}")
             return 'Neutral'
     
-    def search_tracks(self, query: str, limit: int = 10) -> List[Dict]:
+    @with_priority(INTERACTIVE)
+    def search_tracks(self, query: str, limit: int = 10, enrich: bool = True) -> List[TrackRecord]:
         """
         Search for tracks on Spotify
         
         Args:
             query: Search query string
             limit: Number of results to return
+            enrich: Fetch audio features and genres per result (see _extract_track_metadata)
             
         Returns:
             List of matching tracks
         """
         try:
             # Get access token if needed
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-            
-            if not self.access_token:
+            if not self._ensure_access_token():
                 return []
             
-            headers = {'Authorization': f'Bearer {self.access_token}'}
             url = f"{self.api_base_url}/search"
             params = {
                 'q': query,
@@ -306,7 +416,7 @@ class SpotifyService:
                 'limit': limit
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self._api_get('search', url, params=params)
             
             if response.status_code != 200:
                 print(f"Search failed: {response.status_code}")
@@ -317,7 +427,7 @@ class SpotifyService:
             
             results = []
             for track in tracks:
-                song = self._extract_track_metadata(track)
+                song = self._extract_track_metadata(track, enrich=enrich)
                 if song:
                     results.append(song)
             
@@ -327,6 +437,7 @@ class SpotifyService:
             print(f"Error searching tracks: {str(e)}")
             return []
     
+    @with_priority(INTERACTIVE)
     def get_track_preview(self, track_id: str) -> Optional[str]:
         """
         Get preview URL for a specific track
@@ -338,16 +449,12 @@ class SpotifyService:
             Preview URL or None
         """
         try:
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-            
-            if not self.access_token:
+            if not self._ensure_access_token():
                 return None
             
-            headers = {'Authorization': f'Bearer {self.access_token}'}
             url = f"{self.api_base_url}/tracks/{track_id}"
             
-            response = requests.get(url, headers=headers)
+            response = self._api_get('track', url)
             
             if response.status_code == 200:
                 track = response.json()
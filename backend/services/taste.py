@@ -0,0 +1,161 @@
+import hashlib
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional
+
+def song_key(song: Dict) -> str:
+    """Identity of a song in a request body: its id, or title and artist without one"""
+    return str(song.get('id') or f"{song.get('title', '')}|{song.get('artist', '')}")
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big')
+
+class RunningMoments:
+    """
+    Streaming mean and variance (Welford) that also supports removing values,
+    so a profile follows inserts and deletes without rescanning
+    """
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value: float):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - value) / self.count
+        # Clamp float drift; variance can't go negative
+        self.m2 = max(self.m2 - (value - old_mean) * (value - self.mean), 0.0)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+class TasteProfile:
+    """
+    Running summary of a playlist: genre, mood and artist histograms, tempo and
+    energy moments, and an order-insensitive fingerprint of its songs
+
+    Every field is updated per added or removed song, so reading the summary
+    (for prompts, cache keys and stats) never rescans the playlist.
+    """
+
+    __slots__ = ('song_count', 'genres', 'moods', 'artists', 'tempo', 'energy', '_hash')
+
+    def __init__(self):
+        self.song_count = 0
+        self.genres: Dict[str, int] = {}
+        self.moods: Dict[str, int] = {}
+        self.artists: Dict[str, int] = {}
+        self.tempo = RunningMoments()
+        self.energy = RunningMoments()
+        # XOR of per-song key hashes: adding and removing a song are the same operation
+        self._hash = 0
+
+    @property
+    def fingerprint(self) -> str:
+        return f'{self._hash:016x}'
+
+    def add(self, key: str, artist: str, genre: str, mood: str, tempo=None, energy=None):
+        """Count one song in (key identifies it for the fingerprint, see song_key)"""
+        self._update(key, artist, genre, mood, tempo, energy, 1)
+
+    def remove(self, key: str, artist: str, genre: str, mood: str, tempo=None, energy=None):
+        """Take back one song previously passed to add()"""
+        self._update(key, artist, genre, mood, tempo, energy, -1)
+
+    def _update(self, key, artist, genre, mood, tempo, energy, step: int):
+        self.song_count += step
+        self._hash ^= _key_hash(key)
+        for histogram, value in ((self.artists, artist), (self.genres, genre or 'Unknown'), (self.moods, mood or 'Unknown')):
+            count = histogram.get(value, 0) + step
+            if count > 0:
+                histogram[value] = count
+            else:
+                histogram.pop(value, None)
+        # Same validity rules as the prompt summary always used: a tempo of 0 means unknown
+        for moments, value in ((self.tempo, tempo if tempo else None), (self.energy, energy)):
+            if value is None:
+                continue
+            if step > 0:
+                moments.add(float(value))
+            else:
+                moments.remove(float(value))
+
+    @classmethod
+    def from_songs(cls, songs: Iterable[Dict]) -> 'TasteProfile':
+        """Profile of songs from a request body (one pass)"""
+        profile = cls()
+        for song in songs:
+            if isinstance(song, dict):
+                profile.add(song_key(song), song.get('artist', ''), song.get('genre', 'Unknown'),
+                            song.get('mood', 'Unknown'), song.get('tempo'), song.get('energy'))
+        return profile
+
+    @staticmethod
+    def fingerprint_of(songs: Iterable[Dict]) -> str:
+        """Fingerprint of request body songs, comparable with a stored profile's"""
+        value = 0
+        for song in songs:
+            if isinstance(song, dict):
+                value ^= _key_hash(song_key(song))
+        return f'{value:016x}'
+
+    def top(self, histogram: Dict[str, int], n: int) -> List[str]:
+        return heapq.nlargest(n, histogram, key=histogram.get)
+
+    def summary(self) -> Dict:
+        """Public JSON shape of the profile"""
+        return {
+            'songCount': self.song_count,
+            'artistCount': len(self.artists),
+            'topGenres': self.top(self.genres, 5),
+            'topMoods': self.top(self.moods, 3),
+            'genreBreakdown': self.genres,
+            'moodBreakdown': self.moods,
+            'averageTempo': round(self.tempo.mean),
+            'tempoStdDev': round(self.tempo.std, 1),
+            'averageEnergy': round(self.energy.mean, 3),
+            'energyStdDev': round(self.energy.std, 3)
+        }
+
+    def to_json(self) -> Dict:
+        """Serializable state for PlaylistProfile.data"""
+        return {
+            'song_count': self.song_count,
+            'genres': self.genres,
+            'moods': self.moods,
+            'artists': self.artists,
+            'tempo': [self.tempo.count, self.tempo.mean, self.tempo.m2],
+            'energy': [self.energy.count, self.energy.mean, self.energy.m2],
+            'hash': self.fingerprint
+        }
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict]) -> 'TasteProfile':
+        profile = cls()
+        if data:
+            profile.song_count = data['song_count']
+            profile.genres = data['genres']
+            profile.moods = data['moods']
+            profile.artists = data['artists']
+            profile.tempo = RunningMoments(*data['tempo'])
+            profile.energy = RunningMoments(*data['energy'])
+            profile._hash = int(data['hash'], 16)
+        return profile
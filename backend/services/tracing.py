@@ -0,0 +1,117 @@
+"""
+Lightweight per-request span tracing
+
+A trace is attached to the current context only when tracing is enabled
+for the request; span() is a near no-op otherwise (one context variable
+lookup). Finished traces are summarised into a Server-Timing header and,
+when slow, written to the 'musicai.trace' logger as one JSON line.
+"""
+
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger('musicai.trace')
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('musicai_trace', default=None)
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    __slots__ = ('start', 'spans')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # (name, start offset in seconds, duration in seconds, attributes)
+        self.spans: List[Tuple[str, float, float, Dict]] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def summary(self) -> Dict[str, List[float]]:
+        """Total duration (ms) and count per span name, in first-seen order"""
+        totals: Dict[str, List[float]] = {}
+        for name, _, duration, _ in self.spans:
+            entry = totals.setdefault(name, [0.0, 0])
+            entry[0] += duration * 1000
+            entry[1] += 1
+        return totals
+
+class span:
+    """
+    Record a span on the current trace, if there is one
+
+        with span('spotify.search'):
+            ...
+    """
+
+    __slots__ = ('name', 'attrs', 'trace', 'started')
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.trace = _current_trace.get()
+
+    def __enter__(self):
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        trace = self.trace
+        if trace is not None:
+            now = time.perf_counter()
+            if exc_type is not None:
+                self.attrs['error'] = exc_type.__name__
+            trace.spans.append((self.name, self.started - trace.start, now - self.started, self.attrs))
+        return False
+
+def start_trace(enabled: bool) -> Optional[Trace]:
+    """Begin a trace for the current context (or clear any stale one when disabled)"""
+    trace = Trace() if enabled else None
+    _current_trace.set(trace)
+    return trace
+
+def end_trace() -> Optional[Trace]:
+    """Detach and return the current trace"""
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def server_timing_header(trace: Trace) -> str:
+    """
+    Build a Server-Timing header value, one metric per span name plus the total
+
+    Example: spotify.audio_features;dur=812.4;desc="100 calls", total;dur=1034.2
+    """
+    parts = []
+    for name, (duration, count) in trace.summary().items():
+        parts.append(f'{name};dur={duration:.1f};desc="{count} call{"s" if count != 1 else ""}"')
+    parts.append(f'total;dur={trace.elapsed() * 1000:.1f}')
+    return ', '.join(parts)
+
+def log_slow_trace(trace: Trace, threshold_ms: float, **context) -> bool:
+    """
+    Write the full trace to the structured log if it exceeded the threshold
+
+    Returns:
+        Whether the trace was logged
+    """
+    total_ms = trace.elapsed() * 1000
+    if total_ms < threshold_ms:
+        return False
+
+    record = dict(context)
+    record['duration_ms'] = round(total_ms, 1)
+    record['breakdown_ms'] = {name: round(duration, 1) for name, (duration, _) in trace.summary().items()}
+    record['spans'] = [
+        dict(attrs, name=name, start_ms=round(offset * 1000, 2), duration_ms=round(duration * 1000, 2))
+        for name, offset, duration, attrs in trace.spans
+    ]
+    logger.warning(json.dumps(record, default=str))
+    return True
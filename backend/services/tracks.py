@@ -0,0 +1,77 @@
+import sys
+from typing import Dict, Optional
+
+class TrackRecord:
+    """
+    Compact representation of one track, used from Spotify extraction
+    through the DB write to response serialization
+
+    Slotted, with repeated strings (artist, genre, mood) interned, so a
+    10k-track import holds one small object per track instead of a
+    15-key dict plus an ORM object. Dict-shaped JSON is only produced
+    at the edge by to_dict().
+    """
+
+    __slots__ = (
+        'id', 'title', 'artist', 'album', 'genre', 'tempo', 'mood', 'energy',
+        'preview_url', 'spotify_url', 'album_art', 'popularity', 'explicit',
+        'duration_ms', 'release_date'
+    )
+
+    def __init__(self, id: str, title: str, artist: str, album: str = '', genre: str = 'Unknown',
+                 tempo: int = 120, mood: str = 'Neutral', energy: float = 0.5,
+                 preview_url: Optional[str] = None, spotify_url: Optional[str] = None,
+                 album_art: str = '', popularity: int = 50, explicit: bool = False,
+                 duration_ms: int = 0, release_date: str = 'Unknown'):
+        self.id = id
+        self.title = title
+        self.artist = sys.intern(artist)
+        self.album = album
+        self.genre = sys.intern(genre)
+        self.tempo = tempo
+        self.mood = sys.intern(mood)
+        self.energy = energy
+        self.preview_url = preview_url
+        self.spotify_url = spotify_url
+        self.album_art = album_art
+        self.popularity = popularity
+        self.explicit = explicit
+        self.duration_ms = duration_ms
+        self.release_date = release_date
+
+    def __repr__(self):
+        return f"TrackRecord({self.id!r}, {self.title!r}, {self.artist!r})"
+
+    def to_dict(self) -> Dict:
+        """Public JSON shape of a track (same keys the API has always returned)"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'artist': self.artist,
+            'albumName': self.album,
+            'genre': self.genre,
+            'tempo': self.tempo,
+            'mood': self.mood,
+            'energy': self.energy,
+            'previewUrl': self.preview_url or '#',
+            'spotifyUrl': self.spotify_url or '#',
+            'albumArt': self.album_art,
+            'popularity': self.popularity,
+            'explicit': self.explicit,
+            'durationMs': self.duration_ms,
+            'releaseDate': self.release_date
+        }
+
+    def to_row(self) -> Dict:
+        """Column values for an ImportedSong insert"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'artist': self.artist,
+            'album': self.album,
+            'genre': self.genre,
+            'tempo': self.tempo,
+            'mood': self.mood,
+            'energy': self.energy,
+            'preview_url': self.preview_url or ''
+        }
@@ -0,0 +1,140 @@
+"""
+Speculative recommendation generation after a playlist import
+
+When enabled (SPECULATIVE_RECOMMENDATIONS), /api/import schedules the
+playlist's candidate pool to be generated in the background as soon as the
+import commits. The pool is kept in the engine's cache and stored in
+candidate_pools, so a following /api/recommend for the same songs either
+picks from it instantly (in any worker) or attaches to the running job
+instead of starting a second generation.
+
+Cancellation: each import starts a new speculation generation for its owner.
+That owner's jobs of older generations that haven't started are cancelled; a
+job already waiting on Gemini can't be interrupted, so it finishes (serving
+any request attached to it) but its result is not stored. Other users' jobs
+are never affected.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import db, CandidatePool
+from services.metrics import record_cache
+from services.taste import TasteProfile
+
+# Recommendations per request; the pool is generated for this count
+SPECULATIVE_COUNT = 15
+
+# Stored pools kept; older ones are deleted when a new one is stored
+MAX_STORED_POOLS = 20
+
+class RecommendationSpeculator:
+    """Bounded background generation of candidate pools, one job per fingerprint"""
+
+    def __init__(self, app, get_engine: Callable, max_workers: int = 1):
+        """
+        Args:
+            app: Flask app (jobs store their results through its database)
+            get_engine: Returns the GeminiRecommendationEngine to generate with
+            max_workers: Speculative generations allowed to run at once
+        """
+        self.app = app
+        self.get_engine = get_engine
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculate')
+        self._jobs: Dict[str, Future] = {}
+        # Fingerprint -> (owner, generation) of the import that last asked for it
+        self._job_generations: Dict[str, Tuple[str, int]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, owner: str, songs: List[Dict], profile: TasteProfile) -> Optional[Future]:
+        """
+        Start generating the pool for a just-imported playlist
+
+        Args:
+            owner: User who imported the playlist
+            songs: Songs listed in the prompt (the first few are enough)
+            profile: Stored taste profile of the playlist
+
+        Returns:
+            The job future, or None when a pool for these songs already exists
+        """
+        fingerprint = profile.fingerprint
+        engine = self.get_engine()
+        if engine.cached_pool(fingerprint) is not None:
+            return None
+
+        with self._lock:
+            generation = self._generations.get(owner, 0) + 1
+            self._generations[owner] = generation
+            # A newer import supersedes every job of the same user that hasn't started yet
+            for key, job in list(self._jobs.items()):
+                if key != fingerprint and self._job_generations[key][0] == owner and job.cancel():
+                    self._forget(key)
+            job = self._jobs.get(fingerprint)
+            if job is None:
+                job = self._executor.submit(self._run, fingerprint, songs, profile)
+                self._jobs[fingerprint] = job
+            self._job_generations[fingerprint] = (owner, generation)
+        return job
+
+    def _forget(self, fingerprint: str):
+        self._jobs.pop(fingerprint, None)
+        self._job_generations.pop(fingerprint, None)
+
+    def _run(self, fingerprint: str, songs: List[Dict], profile: TasteProfile) -> List[Dict]:
+        try:
+            pool = self.get_engine().candidate_pool(songs, SPECULATIVE_COUNT, profile)
+            with self._lock:
+                owner, generation = self._job_generations[fingerprint]
+                current = generation == self._generations[owner]
+            if pool and current:
+                with self.app.app_context():
+                    store_pool(fingerprint, pool)
+            return pool
+        except Exception as e:
+            print(f"Error in speculative recommendations: {str(e)}")
+            return []
+        finally:
+            with self._lock:
+                self._forget(fingerprint)
+
+    def prime(self, fingerprint: str, timeout: float) -> bool:
+        """
+        Make a speculative pool for this playlist available to the engine
+
+        Waits up to `timeout` seconds for an in-flight job, otherwise loads a
+        stored pool (generated by any worker) into the engine's cache.
+
+        Returns:
+            True if the engine now has a pool for the fingerprint
+        """
+        engine = self.get_engine()
+        if engine.cached_pool(fingerprint) is not None:
+            return True
+
+        with self._lock:
+            job = self._jobs.get(fingerprint)
+        if job is not None:
+            try:
+                job.result(timeout=timeout)
+            except Exception:
+                pass  # Fall through; the caller generates on its own
+            if engine.cached_pool(fingerprint) is not None:
+                record_cache('speculative_pool', True)
+                return True
+
+        row = db.session.get(CandidatePool, fingerprint)
+        record_cache('speculative_pool', row is not None)
+        if row is None:
+            return False
+        engine.seed_pool(fingerprint, row.candidates)
+        return True
+
+def store_pool(fingerprint: str, pool: List[Dict]):
+    """Persist a generated pool, keeping only the newest MAX_STORED_POOLS"""
+    db.session.merge(CandidatePool(fingerprint=fingerprint, candidates=pool))
+    stale = db.select(CandidatePool.fingerprint).order_by(CandidatePool.created_at.desc()).offset(MAX_STORED_POOLS)
+    db.session.execute(db.delete(CandidatePool).where(CandidatePool.fingerprint.in_(stale)))
+    db.session.commit()
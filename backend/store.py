@@ -0,0 +1,389 @@
+"""
+Write helpers for the stored collections.
+
+Every mutation goes through here so the per-table change version is bumped in
+the same transaction as the data it describes. Helpers add to the session but
+do not commit; the caller owns the transaction.
+
+Stored collections are partitioned by owner (a user or session key): every
+helper reads and writes one owner's rows only, through the owner-leading
+primary keys and indexes, so users never delete or lock each other's data.
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict
+
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import (
+    db, Artist, Genre, ImportedSong, Recommendation, BuiltPlaylist, ChangeLog, PlaylistProfile, SongArtist,
+    TableVersion
+)
+from search_index import index_tracks, track_search_row
+from services.taste import TasteProfile
+from services.tracing import current_trace
+from services.tracks import TrackRecord
+
+# Rows per executemany batch; bounds the transient parameter dicts for large imports
+INSERT_CHUNK_SIZE = 500
+
+def get_table_version(owner: str, table_name: str) -> int:
+    """Return the current change version of an owner's table (single primary key lookup)"""
+    row = db.session.get(TableVersion, (owner, table_name))
+    return row.version if row else 0
+
+def bump_table_version(owner: str, table_name: str):
+    """Atomically increment the change version of an owner's table (created at 1)"""
+    statement = sqlite_insert(TableVersion).values(owner=owner, table_name=table_name, version=1)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['owner', 'table_name'],
+        set_={'version': TableVersion.version + 1}
+    ))
+
+CHANGE_UPSERT = 'upsert'
+CHANGE_DELETE = 'delete'
+CHANGE_RESET = 'reset'
+
+def log_changes(owner: str, table_name: str, row_ids, op: str):
+    """Append row-level changes to the change log"""
+    rows = [{'owner': owner, 'table_name': table_name, 'row_id': row_id, 'op': op} for row_id in row_ids]
+    if rows:
+        db.session.execute(db.insert(ChangeLog), rows)
+
+def log_reset(owner: str, table_name: str):
+    """Record that a table was replaced wholesale, dropping its now irrelevant row changes"""
+    db.session.execute(db.delete(ChangeLog).where(ChangeLog.owner == owner, ChangeLog.table_name == table_name))
+    db.session.execute(db.insert(ChangeLog).values(owner=owner, table_name=table_name, op=CHANGE_RESET))
+
+def resolve_dimension_ids(model, names) -> Dict[str, int]:
+    """
+    Map names to ids in a dimension table (Artist or Genre), inserting missing ones
+
+    Args:
+        model: Artist or Genre
+        names: Iterable of names (duplicates and blanks are fine)
+
+    Returns:
+        Dict of lower-cased name -> id
+    """
+    unique = sorted({name for name in names if name})
+    ids = {}
+    for start in range(0, len(unique), INSERT_CHUNK_SIZE):
+        chunk = unique[start:start + INSERT_CHUNK_SIZE]
+        db.session.execute(
+            sqlite_insert(model).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name} for name in chunk]
+        )
+        for row_id, name in db.session.execute(db.select(model.id, model.name).where(model.name.in_(chunk))):
+            ids[name.lower()] = row_id
+    return ids
+
+def split_artists(credit: str) -> List[str]:
+    """
+    Individual artists of a credit string ("A, B" -> ["A", "B"])
+
+    Multiple artists are stored comma separated (see SpotifyService), so a
+    name that itself contains a comma is split as well.
+    """
+    names = {}
+    for name in (credit or '').split(','):
+        name = name.strip()
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+def _attach_dimension_ids(rows: List[Dict]):
+    """Fill genre_id on insert rows from their genre text"""
+    genre_ids = resolve_dimension_ids(Genre, (row['genre'] for row in rows))
+    for row in rows:
+        row['genre_id'] = genre_ids.get((row['genre'] or '').lower())
+
+def _link_song_artists(owner: str, table_name: str, rows: List[Dict]):
+    """Replace the song_artists rows of the given songs (dicts with id and artist)"""
+    if not rows:
+        return
+    artist_ids = resolve_dimension_ids(Artist, (name for row in rows for name in split_artists(row['artist'])))
+    links = {
+        (row['id'], artist_ids.get(name.lower()))
+        for row in rows for name in split_artists(row['artist'])
+    }
+    db.session.execute(db.delete(SongArtist).where(
+        SongArtist.owner == owner,
+        SongArtist.table_name == table_name,
+        SongArtist.song_id.in_({row['id'] for row in rows})
+    ))
+    if links:
+        db.session.execute(db.insert(SongArtist), [
+            {'owner': owner, 'table_name': table_name, 'song_id': song_id, 'artist_id': artist_id}
+            for song_id, artist_id in links if artist_id is not None
+        ])
+
+def _clear_song_artists(owner: str, table_name: str):
+    db.session.execute(db.delete(SongArtist).where(SongArtist.owner == owner, SongArtist.table_name == table_name))
+
+def backfill_dimension_ids():
+    """Populate genre_id and song_artists for rows stored before they existed"""
+    for model in (ImportedSong, Recommendation):
+        while True:
+            pending = db.session.execute(
+                db.select(model.owner, model.id, model.genre)
+                .where(model.genre_id.is_(None) & (model.genre != ''))
+                .limit(INSERT_CHUNK_SIZE)
+            ).all()
+            if not pending:
+                break
+
+            rows = [{'owner': owner, 'id': row_id, 'genre': genre} for owner, row_id, genre in pending]
+            _attach_dimension_ids(rows)
+            # Bulk UPDATE by primary key, so each dict carries the whole (owner, id) key
+            db.session.execute(db.update(model), [
+                {'owner': row['owner'], 'id': row['id'], 'genre_id': row['genre_id']} for row in rows
+            ])
+            if all(row['genre_id'] is None for row in rows):
+                break  # Nothing resolvable left; avoid looping on the same rows
+
+        # Songs without any credited artist link, walked in key order so
+        # credits that split into no names are passed over, not re-read
+        unlinked = ~db.select(SongArtist.song_id).where(
+            SongArtist.owner == model.owner,
+            SongArtist.table_name == model.__tablename__,
+            SongArtist.song_id == model.id
+        ).exists()
+        after = None
+        while True:
+            query = db.select(model.owner, model.id, model.artist).where(unlinked, model.artist != '')
+            if after is not None:
+                query = query.where(db.tuple_(model.owner, model.id) > after)
+            pending = db.session.execute(query.order_by(model.owner, model.id).limit(INSERT_CHUNK_SIZE)).all()
+            if not pending:
+                break
+
+            by_owner: Dict[str, List[Dict]] = {}
+            for owner, row_id, artist in pending:
+                by_owner.setdefault(owner, []).append({'id': row_id, 'artist': artist})
+            for owner, rows in by_owner.items():
+                _link_song_artists(owner, model.__tablename__, rows)
+            after = tuple(pending[-1][:2])
+
+def load_profile(owner: str) -> TasteProfile:
+    """Taste profile of an owner's imported songs (single primary key lookup)"""
+    row = db.session.get(PlaylistProfile, (owner, ImportedSong.__tablename__))
+    return TasteProfile.from_json(row.data if row else None)
+
+def _save_profile(owner: str, profile: TasteProfile):
+    db.session.merge(PlaylistProfile(owner=owner, table_name=ImportedSong.__tablename__, data=profile.to_json()))
+
+def _profile_track(profile: TasteProfile, track: TrackRecord, step: int):
+    update = profile.add if step > 0 else profile.remove
+    update(track.id, track.artist, track.genre, track.mood, track.tempo, track.energy)
+
+def rebuild_profile(owner: str):
+    """Recompute an owner's imported songs profile from the rows (for databases that predate it)"""
+    profile = TasteProfile()
+    rows = db.session.execute(db.select(
+        ImportedSong.id, ImportedSong.artist, ImportedSong.genre,
+        ImportedSong.mood, ImportedSong.tempo, ImportedSong.energy
+    ).where(ImportedSong.owner == owner)).yield_per(INSERT_CHUNK_SIZE)
+    for row in rows:
+        profile.add(*row)
+    _save_profile(owner, profile)
+
+def ensure_profiles():
+    """Build the imported songs profile of every owner that has songs but none stored"""
+    missing = db.session.execute(
+        db.select(ImportedSong.owner).distinct()
+        .where(~db.select(PlaylistProfile.owner).where(
+            PlaylistProfile.owner == ImportedSong.owner,
+            PlaylistProfile.table_name == ImportedSong.__tablename__
+        ).exists())
+    ).scalars().all()
+    for owner in missing:
+        rebuild_profile(owner)
+
+def _ordered_timestamps(count: int):
+    """
+    Strictly increasing created_at values so the keyset sort order
+    (created_at, id) matches the order rows were written in
+    """
+    base = datetime.utcnow()
+    return (base + timedelta(microseconds=i) for i in range(count))
+
+def replace_imported_songs(owner: str, tracks: List[TrackRecord]):
+    """
+    Replace an owner's imported songs with the given track records
+
+    Rows are written with chunked Core inserts straight from the records,
+    so no ORM object is built per track. Tracks also go into the search
+    index, which keeps previously imported ones searchable.
+    """
+    db.session.execute(db.delete(ImportedSong).where(ImportedSong.owner == owner))
+    _clear_song_artists(owner, ImportedSong.__tablename__)
+    profile = TasteProfile()
+
+    timestamps = _ordered_timestamps(len(tracks))
+    for start in range(0, len(tracks), INSERT_CHUNK_SIZE):
+        chunk = tracks[start:start + INSERT_CHUNK_SIZE]
+        rows = []
+        for track in chunk:
+            row = track.to_row()
+            row['owner'] = owner
+            row['created_at'] = next(timestamps)
+            rows.append(row)
+            _profile_track(profile, track, 1)
+        _attach_dimension_ids(rows)
+        db.session.execute(db.insert(ImportedSong), rows)
+        _link_song_artists(owner, ImportedSong.__tablename__, rows)
+        index_tracks((track_search_row(track) for track in chunk), 'imported')
+
+    _save_profile(owner, profile)
+    log_reset(owner, ImportedSong.__tablename__)
+    bump_table_version(owner, ImportedSong.__tablename__)
+
+def upsert_imported_songs(owner: str, tracks: List[TrackRecord]):
+    """
+    Add track records to an owner's imported songs without clearing existing ones
+
+    Tracks already stored are updated in place and keep their position;
+    new ones are appended after everything stored so far. The profile
+    swaps each replaced row's old values for the new ones.
+    """
+    profile = load_profile(owner)
+    # Tracks counted into the profile by this call, by id (playlists can repeat a track)
+    counted: Dict[str, TrackRecord] = {}
+
+    timestamps = _ordered_timestamps(len(tracks))
+    for start in range(0, len(tracks), INSERT_CHUNK_SIZE):
+        chunk = tracks[start:start + INSERT_CHUNK_SIZE]
+        stored = db.session.execute(db.select(
+            ImportedSong.id, ImportedSong.artist, ImportedSong.genre,
+            ImportedSong.mood, ImportedSong.tempo, ImportedSong.energy
+        ).where(
+            ImportedSong.owner == owner,
+            ImportedSong.id.in_([track.id for track in chunk if track.id not in counted])
+        )).all()
+        for row in stored:
+            profile.remove(*row)
+
+        rows = []
+        for track in chunk:
+            row = track.to_row()
+            row['owner'] = owner
+            row['created_at'] = next(timestamps)
+            rows.append(row)
+            if track.id in counted:
+                _profile_track(profile, counted[track.id], -1)
+            _profile_track(profile, track, 1)
+            counted[track.id] = track
+        _attach_dimension_ids(rows)
+        _link_song_artists(owner, ImportedSong.__tablename__, rows)
+        index_tracks((track_search_row(track) for track in chunk), 'imported')
+
+        statement = sqlite_insert(ImportedSong)
+        updated = {
+            column: statement.excluded[column]
+            for column in rows[0] if column not in ('owner', 'id', 'created_at')
+        }
+        db.session.execute(statement.on_conflict_do_update(index_elements=['owner', 'id'], set_=updated), rows)
+        log_changes(owner, ImportedSong.__tablename__, (row['id'] for row in rows), CHANGE_UPSERT)
+
+    if tracks:
+        _save_profile(owner, profile)
+        bump_table_version(owner, ImportedSong.__tablename__)
+
+def replace_recommendations(owner: str, recommendations: List[Dict]):
+    """Replace an owner's stored recommendations with the given recommendation dictionaries"""
+    db.session.execute(db.delete(Recommendation).where(Recommendation.owner == owner))
+    _clear_song_artists(owner, Recommendation.__tablename__)
+
+    genre_ids = resolve_dimension_ids(Genre, (rec.get('genre') for rec in recommendations))
+
+    for rec, created_at in zip(recommendations, _ordered_timestamps(len(recommendations))):
+        db.session.add(Recommendation(
+            owner=owner,
+            id=rec['id'],
+            title=rec['title'],
+            artist=rec['artist'],
+            album=rec.get('album', ''),
+            genre=rec.get('genre', ''),
+            tempo=rec.get('tempo', 0),
+            mood=rec.get('mood', ''),
+            reason=rec.get('reason', ''),
+            preview_url=rec.get('preview_url', ''),
+            created_at=created_at,
+            genre_id=genre_ids.get((rec.get('genre') or '').lower())
+        ))
+    _link_song_artists(owner, Recommendation.__tablename__, recommendations)
+
+    log_reset(owner, Recommendation.__tablename__)
+    bump_table_version(owner, Recommendation.__tablename__)
+
+def replace_built_playlist(owner: str, songs: List[Dict]):
+    """
+    Replace an owner's built playlist with the given songs
+
+    The usual edits (songs removed, songs appended) are applied as row-level
+    deletes and inserts so sync clients receive only those; any other change
+    (e.g. a reorder) rewrites the playlist.
+    """
+    stored = db.session.execute(
+        db.select(BuiltPlaylist.song_id)
+        .where(BuiltPlaylist.owner == owner)
+        .order_by(BuiltPlaylist.added_at, BuiltPlaylist.id)
+    ).scalars().all()
+    song_ids = [song['id'] for song in songs]
+    wanted = set(song_ids)
+    kept = [song_id for song_id in stored if song_id in wanted]
+
+    if song_ids[:len(kept)] == kept:
+        removed = [song_id for song_id in stored if song_id not in wanted]
+        added = song_ids[len(kept):]
+        if removed:
+            db.session.execute(db.delete(BuiltPlaylist).where(
+                BuiltPlaylist.owner == owner, BuiltPlaylist.song_id.in_(removed)
+            ))
+            log_changes(owner, BuiltPlaylist.__tablename__, removed, CHANGE_DELETE)
+        log_changes(owner, BuiltPlaylist.__tablename__, added, CHANGE_UPSERT)
+    else:
+        db.session.execute(db.delete(BuiltPlaylist).where(BuiltPlaylist.owner == owner))
+        log_reset(owner, BuiltPlaylist.__tablename__)
+        added = song_ids
+
+    for song_id, added_at in zip(added, _ordered_timestamps(len(added))):
+        db.session.add(BuiltPlaylist(
+            owner=owner,
+            id=f"pl_{song_id}",
+            song_id=song_id,
+            added_at=added_at
+        ))
+
+    bump_table_version(owner, BuiltPlaylist.__tablename__)
+
+# Trace spans for session flushes and commits. Listeners are attached to the base
+# Session class so they cover Flask-SQLAlchemy's scoped sessions as well.
+def _record_db_span(session, key, name):
+    started = session.info.pop(key, None)
+    trace = current_trace()
+    if started is not None and trace is not None:
+        now = time.perf_counter()
+        trace.spans.append((name, started - trace.start, now - started, {}))
+
+@event.listens_for(Session, 'before_flush')
+def _flush_started(session, flush_context, instances):
+    if current_trace() is not None:
+        session.info['trace_flush_start'] = time.perf_counter()
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _flush_finished(session, flush_context):
+    _record_db_span(session, 'trace_flush_start', 'db.flush')
+
+@event.listens_for(Session, 'before_commit')
+def _commit_started(session):
+    if current_trace() is not None:
+        session.info['trace_commit_start'] = time.perf_counter()
+
+@event.listens_for(Session, 'after_commit')
+def _commit_finished(session):
+    _record_db_span(session, 'trace_commit_start', 'db.commit')
@@ -0,0 +1,110 @@
+"""
+Snapshot and delta sync of all stored state for /api/bootstrap
+
+Everything is scoped to one owner's partition. The change version is the
+owner's newest change_log sequence number. A client keeps
+the version of its last sync and asks for ?since=<version>; per collection it
+gets the rows upserted and the ids deleted since then, or the whole
+collection when it was replaced wholesale (reset) in the meantime.
+"""
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from models import db, ImportedSong, Recommendation, BuiltPlaylist, ChangeLog
+from pagination import fetch_page
+from serializers import IMPORTED_SONG_FIELDS, RECOMMENDATION_FIELDS, serialize_recommendation
+from store import CHANGE_DELETE, CHANGE_RESET
+
+# Ids per IN (...) lookup
+ID_CHUNK_SIZE = 500
+
+def current_change_version(owner: str) -> int:
+    """Change version of an owner's data (0 before their first write)"""
+    return db.session.execute(
+        db.select(func.max(ChangeLog.seq)).where(ChangeLog.owner == owner)
+    ).scalar() or 0
+
+def _chunks(ids: List[str]):
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[start:start + ID_CHUNK_SIZE]
+
+def _collection_rows(model, columns: Dict, owner: str, ids: Optional[List[str]]) -> List[Dict]:
+    fields = list(columns)
+    if ids is None:
+        return fetch_page(model, columns, fields, None, None, owner=owner)[0]
+    items = []
+    for chunk in _chunks(ids):
+        items.extend(fetch_page(model, columns, fields, None, None, [model.id.in_(chunk)], owner=owner)[0])
+    return items
+
+def playlist_query(owner: str):
+    """An owner's built playlist songs as Recommendation rows, in playlist order"""
+    return (
+        db.session.query(Recommendation)
+        .join(BuiltPlaylist, (BuiltPlaylist.owner == Recommendation.owner) & (BuiltPlaylist.song_id == Recommendation.id))
+        .filter(BuiltPlaylist.owner == owner)
+        .order_by(BuiltPlaylist.added_at, BuiltPlaylist.id)
+    )
+
+def _playlist_rows(owner: str, song_ids: Optional[List[str]]) -> List[Dict]:
+    """Built playlist songs (recommendation fields), in playlist order"""
+    query = playlist_query(owner)
+    if song_ids is None:
+        return [serialize_recommendation(rec) for rec in query]
+    items = []
+    for chunk in _chunks(song_ids):
+        items.extend(serialize_recommendation(rec) for rec in query.filter(BuiltPlaylist.song_id.in_(chunk)))
+    return items
+
+# Response key -> (table, rows loader(owner, ids)). Playlist changes are logged by song id.
+COLLECTIONS = {
+    'songs': (ImportedSong.__tablename__,
+              lambda owner, ids: _collection_rows(ImportedSong, IMPORTED_SONG_FIELDS, owner, ids)),
+    'recommendations': (Recommendation.__tablename__,
+                        lambda owner, ids: _collection_rows(Recommendation, RECOMMENDATION_FIELDS, owner, ids)),
+    'playlist': (BuiltPlaylist.__tablename__, _playlist_rows),
+}
+
+def build_snapshot(owner: str) -> Dict[str, List[Dict]]:
+    """Every stored collection of an owner in full"""
+    return {key: load(owner, None) for key, (_, load) in COLLECTIONS.items()}
+
+def build_delta(owner: str, since: int) -> Dict[str, Dict]:
+    """
+    Changes to an owner's stored collections after version `since`
+
+    Returns:
+        Per collection key: {'reset': bool, 'upserted': [rows], 'deleted': [ids]}
+    """
+    changes = db.session.execute(
+        db.select(ChangeLog.table_name, ChangeLog.row_id, ChangeLog.op)
+        .where(ChangeLog.owner == owner, ChangeLog.seq > since)
+        .order_by(ChangeLog.seq)
+    ).all()
+
+    reset = set()
+    latest: Dict[str, Dict[str, str]] = {}
+    for table_name, row_id, op in changes:
+        if op == CHANGE_RESET:
+            reset.add(table_name)
+        else:
+            latest.setdefault(table_name, {})[row_id] = op
+    # Playlist songs are recommendation rows, so replacing those changes the playlist too
+    if Recommendation.__tablename__ in reset:
+        reset.add(BuiltPlaylist.__tablename__)
+
+    delta = {}
+    for key, (table_name, load) in COLLECTIONS.items():
+        if table_name in reset:
+            delta[key] = {'reset': True, 'upserted': load(owner, None), 'deleted': []}
+            continue
+        ops = latest.get(table_name, {})
+        upserted = [row_id for row_id, op in ops.items() if op != CHANGE_DELETE]
+        delta[key] = {
+            'reset': False,
+            'upserted': load(owner, upserted) if upserted else [],
+            'deleted': [row_id for row_id, op in ops.items() if op == CHANGE_DELETE]
+        }
+    return delta
@@ -0,0 +1,37 @@
+"""Shared test case: the app on a temporary SQLite database"""
+
+import os
+import tempfile
+import unittest
+
+from app import create_app, create_tables
+from services.tracks import TrackRecord
+
+def make_tracks(prefix, count, artist='Artist'):
+    """Track records <prefix>-0 .. <prefix>-<count - 1>"""
+    return [TrackRecord(id=f'{prefix}-{i}', title=f'Song {i}', artist=artist, album='Album',
+                        genre='Pop', tempo=120, mood='Happy')
+            for i in range(count)]
+
+class AppTestCase(unittest.TestCase):
+    """Creates a fresh app, test client and database for every test"""
+
+    # Extra create_app config for the test case
+    config = {}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'musicai.db')
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}', **self.config})
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        create_tables()
+
+    def tearDown(self):
+        from models import db
+        db.session.remove()
+        self.ctx.pop()
+        with self.app.app_context():
+            self.app.extensions['sqlalchemy'].engines[None].dispose()
+        self.tmp.cleanup()
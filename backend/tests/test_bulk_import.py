@@ -0,0 +1,69 @@
+import os
+
+from bulk_import import BulkImporter, Checkpoint
+from models import db, ImportedSong
+from services.spotify_service import PlaylistFetchError
+from tests.support import AppTestCase, make_tracks
+
+class FakeSpotify:
+    """Serves playlists by URL; URLs in `broken` fail mid-pagination"""
+
+    def __init__(self, sizes, broken=()):
+        self.sizes = sizes
+        self.broken = set(broken)
+        self.fetched = []
+
+    def _extract_playlist_id(self, url):
+        return url.rsplit('/', 1)[-1]
+
+    def get_playlist_tracks(self, url, strict=False):
+        playlist_id = self._extract_playlist_id(url)
+        self.fetched.append(playlist_id)
+        if playlist_id in self.broken:
+            if strict:
+                raise PlaylistFetchError('Tracks page at offset 100 returned 500')
+            return make_tracks(playlist_id, 100)
+        return make_tracks(playlist_id, self.sizes[playlist_id])
+
+def urls(*playlist_ids):
+    return [f'https://open.spotify.com/playlist/{playlist_id}' for playlist_id in playlist_ids]
+
+class BulkImportTest(AppTestCase):
+    def checkpoint(self, owner='default'):
+        return Checkpoint(os.path.join(self.tmp.name, 'checkpoint.json'), owner)
+
+    def stored_ids(self, owner):
+        return set(db.session.execute(db.select(ImportedSong.id).where(ImportedSong.owner == owner)).scalars())
+
+    def test_failed_page_is_not_checkpointed(self):
+        spotify = FakeSpotify({'good': 3}, broken={'bad'})
+        failures = BulkImporter(spotify, self.checkpoint(), workers=2, batch_size=10).run(urls('good', 'bad'))
+
+        self.assertEqual(failures, 1)
+        checkpoint = self.checkpoint()
+        self.assertTrue(checkpoint.is_done('good'))
+        self.assertFalse(checkpoint.is_done('bad'))
+        self.assertIn('bad', checkpoint.failed)
+        self.assertFalse(any(song_id.startswith('bad-') for song_id in self.stored_ids('default')))
+
+        # A resumed run retries only the failed playlist
+        spotify = FakeSpotify({'good': 3, 'bad': 2})
+        self.assertEqual(BulkImporter(spotify, self.checkpoint(), workers=2, batch_size=10).run(urls('good', 'bad')), 0)
+        self.assertEqual(spotify.fetched, ['bad'])
+
+    def test_checkpoint_is_per_owner(self):
+        spotify = FakeSpotify({'p1': 2})
+        BulkImporter(spotify, self.checkpoint('alice'), workers=1, batch_size=10, owner='alice').run(urls('p1'))
+
+        spotify = FakeSpotify({'p1': 2})
+        BulkImporter(spotify, self.checkpoint('bob'), workers=1, batch_size=10, owner='bob').run(urls('p1'))
+        self.assertEqual(spotify.fetched, ['p1'])
+        self.assertEqual(self.stored_ids('bob'), {'p1-0', 'p1-1'})
+        self.assertTrue(self.checkpoint('alice').is_done('p1'))
+
+    def test_many_playlists_in_bounded_batches(self):
+        sizes = {f'p{i}': 5 for i in range(40)}
+        importer = BulkImporter(FakeSpotify(sizes), self.checkpoint(), workers=3, batch_size=12)
+        self.assertEqual(importer.run(urls(*sizes)), 0)
+        self.assertEqual(importer.imported_tracks, 200)
+        self.assertEqual(len(self.stored_ids('default')), 200)
@@ -0,0 +1,52 @@
+import gzip
+from unittest import mock
+
+import compression
+from models import db
+from store import replace_imported_songs
+from tests.support import AppTestCase, make_tracks
+
+class CompressionTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        replace_imported_songs('default', make_tracks('t', 50))
+        db.session.commit()
+
+    def get(self, path='/api/stored/imported', encoding=None):
+        headers = {'Accept-Encoding': encoding} if encoding else {}
+        return self.client.get(path, headers=headers)
+
+    def test_gzip_when_brotli_unavailable(self):
+        plain = self.get()
+        with mock.patch.object(compression, 'brotli', None):
+            response = self.get(encoding='br, gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.get_data()), plain.get_data())
+
+    def test_brotli_preferred(self):
+        if compression.brotli is None:
+            self.skipTest('brotli is not installed')
+        response = self.get(encoding='gzip, br')
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.get_data()), self.get().get_data())
+
+    def test_not_compressed(self):
+        # No Accept-Encoding, an encoding we don't support, or an explicit refusal
+        for encoding in (None, 'identity', 'gzip;q=0'):
+            with mock.patch.object(compression, 'brotli', None):
+                response = self.get(encoding=encoding)
+            self.assertNotIn('Content-Encoding', response.headers, encoding)
+            self.assertTrue(response.get_json()['songs'])
+
+    def test_small_bodies_stay_uncompressed(self):
+        response = self.get('/api/health', encoding='gzip')
+        self.assertLess(len(response.get_data()), compression.DEFAULT_MIN_SIZE)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_not_modified_is_not_compressed(self):
+        etag = self.get().headers['ETag']
+        response = self.client.get('/api/stored/imported',
+                                   headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('Content-Encoding', response.headers)
@@ -0,0 +1,54 @@
+from models import db, SongArtist
+from store import replace_imported_songs, replace_recommendations, split_artists, upsert_imported_songs
+from tests.support import AppTestCase, make_tracks
+
+def track(track_id, artist, genre='Pop', mood='Happy', tempo=120):
+    record = make_tracks(track_id, 1)[0]
+    record.id, record.artist, record.genre, record.mood, record.tempo = track_id, artist, genre, mood, tempo
+    return record
+
+class ArtistFilterTest(AppTestCase):
+    def ids(self, path, **headers):
+        body = self.client.get(path, headers=headers).get_json()
+        return sorted(song['id'] for song in body.get('songs', body.get('recommendations', [])))
+
+    def test_split_artists(self):
+        self.assertEqual(split_artists('A, B,  a ,C'), ['A', 'B', 'C'])
+        self.assertEqual(split_artists(''), [])
+
+    def test_collaborations_match_each_artist(self):
+        replace_imported_songs('default', [
+            track('t1', 'Daft Punk'),
+            track('t2', 'Daft Punk, Pharrell Williams'),
+            track('t3', 'Pharrell Williams', genre='Hip Hop'),
+        ])
+        db.session.commit()
+
+        self.assertEqual(self.ids('/api/stored/imported?artist=daft%20punk'), ['t1', 't2'])
+        self.assertEqual(self.ids('/api/stored/imported?artist=Pharrell%20Williams'), ['t2', 't3'])
+        self.assertEqual(self.ids('/api/stored/imported?artist=Pharrell%20Williams&genre=Pop'), ['t2'])
+        self.assertEqual(self.ids('/api/stored/imported?artist=Daft%20Punk,%20Pharrell%20Williams'), [])
+
+    def test_links_follow_rewrites(self):
+        replace_imported_songs('default', [track('t1', 'A, B')])
+        upsert_imported_songs('default', [track('t1', 'C')])
+        replace_imported_songs('other', [track('t1', 'A')])
+        db.session.commit()
+
+        self.assertEqual(self.ids('/api/stored/imported?artist=A'), [])
+        self.assertEqual(self.ids('/api/stored/imported?artist=C'), ['t1'])
+        self.assertEqual(self.ids('/api/stored/imported?artist=A', **{'X-User-Id': 'other'}), ['t1'])
+
+        replace_imported_songs('default', [])
+        db.session.commit()
+        remaining = db.session.execute(db.select(SongArtist.owner).distinct()).scalars().all()
+        self.assertEqual(remaining, ['other'])
+
+    def test_recommendations_filter(self):
+        replace_recommendations('default', [
+            {'id': 'rec_0', 'title': 'One', 'artist': 'A, B', 'genre': 'Pop'},
+            {'id': 'rec_1', 'title': 'Two', 'artist': 'B', 'genre': 'Pop'},
+        ])
+        db.session.commit()
+        self.assertEqual(self.ids('/api/stored/recommendations?artist=b'), ['rec_0', 'rec_1'])
+        self.assertEqual(self.ids('/api/stored/recommendations?artist=a'), ['rec_0'])
@@ -0,0 +1,22 @@
+import unittest
+
+from services.metrics import MetricsRegistry
+
+class RenderTest(unittest.TestCase):
+    def test_metadata_uses_sample_names(self):
+        registry = MetricsRegistry()
+        registry.counter('app_requests', 'Requests', ('status',)).inc('200')
+        registry.histogram('app_latency_seconds', 'Latency', buckets=(0.1, 1.0)).observe(0.5)
+        lines = registry.render().splitlines()
+
+        self.assertEqual(lines[:3], [
+            '# HELP app_requests_total Requests',
+            '# TYPE app_requests_total counter',
+            'app_requests_total{status="200"} 1',
+        ])
+        self.assertEqual(lines[3:5], [
+            '# HELP app_latency_seconds Latency',
+            '# TYPE app_latency_seconds histogram',
+        ])
+        self.assertIn('app_latency_seconds_bucket{le="1.0"} 1', lines)
+        self.assertIn('app_latency_seconds_count 1', lines)
@@ -0,0 +1,112 @@
+"""
+Upgrade of a database created before owner partitioning and the dimension tables
+
+    cd backend
+    python -m pytest tests
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app import create_app
+
+# Schema of the original models (no owner column, no dimension ids, no indexes)
+LEGACY_SCHEMA = """
+CREATE TABLE imported_songs (
+    id VARCHAR(255) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    artist VARCHAR(255) NOT NULL,
+    album VARCHAR(255),
+    genre VARCHAR(100),
+    tempo FLOAT,
+    mood VARCHAR(50),
+    preview_url VARCHAR(255),
+    created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE TABLE recommendations (
+    id VARCHAR(255) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    artist VARCHAR(255) NOT NULL,
+    album VARCHAR(255),
+    genre VARCHAR(100),
+    tempo FLOAT,
+    mood VARCHAR(50),
+    reason TEXT,
+    preview_url VARCHAR(255),
+    created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE TABLE built_playlist (
+    id VARCHAR(255) NOT NULL,
+    song_id VARCHAR(255),
+    added_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(song_id) REFERENCES recommendations (id)
+);
+"""
+
+class LegacyDatabaseUpgradeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'musicai.db')
+        with sqlite3.connect(path) as conn:
+            conn.executescript(LEGACY_SCHEMA)
+            conn.executemany(
+                'INSERT INTO imported_songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    ('s1', 'Song One', 'Artist A', 'Album', 'Rock', 120.0, 'Happy', None, '2024-01-01 00:00:00.000000'),
+                    ('s2', 'Song Two', 'Artist B, Artist A', 'Album', 'Jazz', 90.0, 'Chill', None, '2024-01-02 00:00:00.000000'),
+                ]
+            )
+            conn.execute(
+                'INSERT INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                ('r1', 'Rec One', 'Artist A', 'Album', 'Rock', 125.0, 'Energetic', 'Similar', None, '2024-01-03 00:00:00.000000')
+            )
+            conn.execute('INSERT INTO built_playlist VALUES (?, ?, ?)', ('p1', 'r1', '2024-01-04 00:00:00.000000'))
+        conn.close()
+
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            self.app.extensions['sqlalchemy'].engines[None].dispose()
+        self.tmp.cleanup()
+
+    def test_health_after_upgrade(self):
+        response = self.client.get('/api/health')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rows_move_to_default_owner(self):
+        songs = self.client.get('/api/stored/imported').get_json()['songs']
+        self.assertEqual(sorted(song['id'] for song in songs), ['s1', 's2'])
+
+        playlist = self.client.get('/api/stored/playlist').get_json()['songs']
+        self.assertEqual([song['id'] for song in playlist], ['r1'])
+
+        # Legacy rows belong to the default partition only
+        other = self.client.get('/api/stored/imported', headers={'X-User-Id': 'someone-else'})
+        self.assertEqual(other.get_json()['songs'], [])
+
+    def test_dimension_ids_backfilled(self):
+        self.client.get('/api/health')
+        with self.app.app_context():
+            from models import db, ImportedSong, Recommendation
+            for model in (ImportedSong, Recommendation):
+                rows = db.session.execute(db.select(model.owner, model.genre_id)).all()
+                self.assertTrue(rows)
+                for owner, genre_id in rows:
+                    self.assertEqual(owner, 'default')
+                    self.assertIsNotNone(genre_id)
+
+        # Every credited artist is linked, so the collaboration matches both
+        songs = self.client.get('/api/stored/imported?artist=artist%20a').get_json()['songs']
+        self.assertEqual(sorted(song['id'] for song in songs), ['s1', 's2'])
+        songs = self.client.get('/api/stored/imported?artist=Artist B').get_json()['songs']
+        self.assertEqual([song['id'] for song in songs], ['s2'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from models import db
+from store import replace_imported_songs, upsert_imported_songs
+from tests.support import AppTestCase, make_tracks
+
+class StoredPaginationTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        replace_imported_songs('default', make_tracks('t', 25))
+        db.session.commit()
+
+    def test_cursor_walks_every_row_once_in_import_order(self):
+        seen, cursor = [], None
+        while True:
+            query = '/api/stored/imported?limit=10' + (f'&cursor={cursor}' if cursor else '')
+            body = self.client.get(query).get_json()
+            seen.extend(song['id'] for song in body['songs'])
+            cursor = body['nextCursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, [f't-{i}' for i in range(25)])
+
+    def test_rows_added_after_the_cursor_appear_on_later_pages(self):
+        first = self.client.get('/api/stored/imported?limit=20').get_json()
+        upsert_imported_songs('default', make_tracks('new', 2))
+        db.session.commit()
+
+        rest = self.client.get(f"/api/stored/imported?limit=20&cursor={first['nextCursor']}").get_json()
+        self.assertEqual([song['id'] for song in rest['songs']],
+                         [f't-{i}' for i in range(20, 25)] + ['new-0', 'new-1'])
+        self.assertIsNone(rest['nextCursor'])
+
+    def test_projection(self):
+        body = self.client.get('/api/stored/imported?limit=1&fields=id,title').get_json()
+        self.assertEqual(body['songs'], [{'id': 't-0', 'title': 'Song 0'}])
+
+    def test_invalid_parameters(self):
+        for query in ('limit=0', 'limit=x', 'cursor=not-a-cursor', 'fields=id,secret'):
+            response = self.client.get(f'/api/stored/imported?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_etag_revalidation(self):
+        response = self.client.get('/api/stored/imported?limit=5')
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        cached = self.client.get('/api/stored/imported?limit=5', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.get_data(), b'')
+
+        # Another page or projection of the same data has its own ETag
+        other = self.client.get('/api/stored/imported?limit=6', headers={'If-None-Match': etag})
+        self.assertEqual(other.status_code, 200)
+
+        # So does another user's partition of the same table
+        other_user = self.client.get('/api/stored/imported?limit=5',
+                                     headers={'If-None-Match': etag, 'X-User-Id': 'someone-else'})
+        self.assertEqual(other_user.status_code, 200)
+
+        upsert_imported_songs('default', make_tracks('new', 1))
+        db.session.commit()
+        changed = self.client.get('/api/stored/imported?limit=5', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
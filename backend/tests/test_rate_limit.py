@@ -0,0 +1,62 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from services.rate_limit import BULK, INTERACTIVE, TokenBucket, current_priority, request_priority, with_priority
+
+class TokenBucketPriorityTest(unittest.TestCase):
+    def drain(self, bucket, priority):
+        taken = 0
+        while bucket.try_acquire(priority=priority) == 0:
+            taken += 1
+        return taken
+
+    def test_bulk_leaves_the_interactive_reserve(self):
+        # Slow refill so the test's own run time adds no meaningful tokens
+        bucket = TokenBucket(rate=0.01, capacity=10, interactive_reserve=0.3)
+        self.assertEqual(self.drain(bucket, BULK), 7)
+        self.assertGreater(bucket.try_acquire(priority=BULK), 0)
+        self.assertEqual(self.drain(bucket, INTERACTIVE), 3)
+
+    def test_bulk_can_always_take_a_token(self):
+        bucket = TokenBucket(rate=0.01, capacity=1, interactive_reserve=0.9)
+        self.assertEqual(bucket.try_acquire(priority=BULK), 0)
+
+    def test_bulk_yields_to_waiting_interactive_callers(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        self.assertEqual(bucket.try_acquire(priority=INTERACTIVE), 0)
+
+        waiter = threading.Thread(target=bucket.acquire, kwargs={'priority': INTERACTIVE})
+        waiter.start()
+        deadline = time.monotonic() + 2
+        while not bucket._interactive_waiting and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # Even once a token is back, bulk callers wait while the interactive one does
+        self.assertGreater(bucket.try_acquire(priority=BULK), 0)
+        waiter.join(2)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(bucket._interactive_waiting, 0)
+
+    def test_pause_blocks_every_priority(self):
+        bucket = TokenBucket(rate=100, capacity=10)
+        bucket.pause(5)
+        self.assertGreater(bucket.try_acquire(priority=INTERACTIVE), 4)
+        self.assertGreater(bucket.try_acquire(priority=BULK), 4)
+
+    def test_shared_state_is_one_budget(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bucket.db')
+            first = TokenBucket(rate=0.01, capacity=4, state_path=path)
+            second = TokenBucket(rate=0.01, capacity=4, state_path=path)
+            self.assertEqual(self.drain(first, INTERACTIVE) + self.drain(second, INTERACTIVE), 4)
+            second.pause(5)
+            self.assertGreater(first.try_acquire(), 4)
+
+    def test_priority_context(self):
+        self.assertEqual(current_priority(), INTERACTIVE)
+        with request_priority(BULK):
+            self.assertEqual(current_priority(), BULK)
+        self.assertEqual(with_priority(BULK)(current_priority)(), BULK)
+        self.assertEqual(current_priority(), INTERACTIVE)
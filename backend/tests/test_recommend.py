@@ -0,0 +1,44 @@
+from services.gemini_service import GeminiRecommendationEngine
+from tests.support import AppTestCase
+
+class PoolEngine(GeminiRecommendationEngine):
+    """Engine whose generations return a fixed pool and are counted"""
+
+    def __init__(self, pool_size):
+        super().__init__(api_key='test')
+        self.pool_size = pool_size
+        self.generations = 0
+
+    def _generate_candidates(self, songs, profile, count):
+        self.generations += 1
+        return [{
+            'id': f'rec_{i}', 'title': f'Song {i}', 'artist': f'Artist {i}', 'genre': 'Pop',
+            'tempo': 100 + i, 'mood': 'Happy', 'reason': '', 'matchScore': 1 - i / 100
+        } for i in range(self.pool_size)]
+
+SONGS = [{'id': 's1', 'title': 'Seed', 'artist': 'Seed Artist', 'genre': 'Pop', 'tempo': 120, 'mood': 'Happy'}]
+
+class RepeatRecommendTest(AppTestCase):
+    def setUp(self):
+        self.engine = PoolEngine(pool_size=30)
+        self.config = {'GEMINI_ENGINE': self.engine}
+        super().setUp()
+
+    def recommend(self):
+        body = self.client.post('/api/recommend', json={'songs': SONGS}).get_json()
+        return {rec['id'] for rec in body['recommendations']}
+
+    def test_repeat_requests_move_through_the_pool(self):
+        first, second = self.recommend(), self.recommend()
+        self.assertEqual(len(first), 15)
+        self.assertEqual(len(second), 15)
+        self.assertFalse(first & second)
+        self.assertEqual(self.engine.generations, 1)
+
+        # Fewer than 15 unseen candidates left: start over from the whole pool
+        self.assertEqual(self.recommend(), first)
+
+    def test_other_users_are_not_excluded(self):
+        first = self.recommend()
+        other = self.client.post('/api/recommend', json={'songs': SONGS}, headers={'X-User-Id': 'other'})
+        self.assertEqual({rec['id'] for rec in other.get_json()['recommendations']}, first)
@@ -0,0 +1,77 @@
+import json
+import unittest
+from unittest import mock
+
+from services import recommendation_schema
+from services.recommendation_schema import (
+    FIELD_DEFAULTS, MalformedResponseError, normalize_mood, parse_recommendations
+)
+
+def item(**fields):
+    rec = {'id': 'r1', 'title': 'Song', 'artist': 'Artist', 'genre': 'Pop', 'tempo': 120,
+           'mood': 'Happy', 'reason': 'Because', 'matchScore': 0.9}
+    rec.update(fields)
+    return rec
+
+class ParseRecommendationsTest(unittest.TestCase):
+    def test_valid_array(self):
+        recs = parse_recommendations(json.dumps([item(id='a', matchScore=0.5), item(id='b', matchScore=0.8)]))
+        self.assertEqual([rec['id'] for rec in recs], ['b', 'a'])
+        self.assertEqual(recs[0]['previewUrl'], '#')
+
+    def test_malformed_text_is_rejected(self):
+        complete = json.dumps([item(), item(id='r2')])
+        for text in (None, '', '   ', 'Here are some songs you may like!', complete[:-10],
+                     '{"title": "Song"}', '[{"title": "Song",]'):
+            with self.assertRaises(MalformedResponseError, msg=repr(text)):
+                parse_recommendations(text)
+
+    def test_malformed_is_a_value_error(self):
+        self.assertTrue(issubclass(MalformedResponseError, ValueError))
+
+    def test_items_without_title_or_artist_are_dropped(self):
+        text = json.dumps([item(title=''), item(artist=None), 'not an object', 42, item(id='kept')])
+        self.assertEqual([rec['id'] for rec in parse_recommendations(text)], ['kept'])
+
+    def test_invalid_fields_get_defaults(self):
+        text = json.dumps([item(tempo='fast', mood='Melancholic', matchScore='high', genre=None)])
+        rec = parse_recommendations(text)[0]
+        self.assertEqual(rec['tempo'], FIELD_DEFAULTS['tempo'])
+        self.assertEqual(rec['mood'], FIELD_DEFAULTS['mood'])
+        self.assertEqual(rec['matchScore'], FIELD_DEFAULTS['matchScore'])
+        self.assertEqual(rec['genre'], FIELD_DEFAULTS['genre'])
+
+    def test_non_finite_numbers_are_rejected(self):
+        # Literals are invalid JSON; as strings they are invalid field values
+        for literal in ('NaN', 'Infinity', '-Infinity', '1e999'):
+            with self.assertRaises(MalformedResponseError, msg=literal):
+                parse_recommendations(json.dumps([item()])[:-2] + f', "extra": {literal}}}]')
+        rec = parse_recommendations(json.dumps([item(tempo='inf', matchScore='NaN')]))[0]
+        self.assertEqual(rec['tempo'], FIELD_DEFAULTS['tempo'])
+        self.assertEqual(rec['matchScore'], FIELD_DEFAULTS['matchScore'])
+
+    def test_numbers_are_clamped_to_schema_bounds(self):
+        recs = parse_recommendations(json.dumps([item(id='hi', tempo=500, matchScore=3),
+                                                 item(id='lo', tempo=10, matchScore=-1)]))
+        high, low = recs
+        self.assertEqual((high['tempo'], low['tempo']), (300, 40))
+        self.assertEqual((high['matchScore'], low['matchScore']), (1.0, 0.0))
+        self.assertIsInstance(high['matchScore'], float)
+        self.assertIsInstance(low['tempo'], int)
+
+    def test_missing_ids_are_numbered(self):
+        recs = parse_recommendations(json.dumps([item(id=None, matchScore=0.9), item(id='', matchScore=0.8)]))
+        self.assertEqual([rec['id'] for rec in recs], ['rec_0', 'rec_1'])
+
+    def test_mood_is_case_insensitive(self):
+        self.assertEqual(parse_recommendations(json.dumps([item(mood=' chill ')]))[0]['mood'], 'Chill')
+        self.assertEqual(normalize_mood('ENERGETIC'), 'Energetic')
+        self.assertEqual(normalize_mood('Melancholic'), 'Neutral')
+
+class JsonFallbackTest(ParseRecommendationsTest):
+    """The same cases decoded with json instead of orjson"""
+
+    def setUp(self):
+        patcher = mock.patch.object(recommendation_schema, 'orjson', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+from services import reranking
+from services.reranking import CandidatePoolCache, mmr_rerank
+
+def candidate(i, artist, score, genre='Pop', mood='Happy', tempo=120):
+    return {'id': f'c{i}', 'artist': artist, 'genre': genre, 'mood': mood, 'tempo': tempo, 'matchScore': score}
+
+# One artist dominates the top scores
+POOL = [candidate(i, 'Same Artist', 0.99 - i * 0.01) for i in range(6)] + [
+    candidate(6, 'Other', 0.90, genre='Jazz', mood='Chill', tempo=80),
+    candidate(7, 'Third', 0.89, genre='Rock', mood='Energetic', tempo=170),
+]
+
+class MmrRerankTest(unittest.TestCase):
+    def ids(self, candidates):
+        return [c['id'] for c in candidates]
+
+    def test_zero_diversity_keeps_score_order(self):
+        self.assertEqual(self.ids(mmr_rerank(POOL, 4, diversity=0)), ['c0', 'c1', 'c2', 'c3'])
+
+    def test_diversity_breaks_up_one_artist(self):
+        picked = mmr_rerank(POOL, 3)
+        self.assertEqual(picked[0]['id'], 'c0')
+        self.assertEqual({c['artist'] for c in picked}, {'Same Artist', 'Other', 'Third'})
+
+    def test_counts(self):
+        self.assertEqual(mmr_rerank(POOL, 0), [])
+        self.assertEqual(mmr_rerank([], 5), [])
+        self.assertEqual(sorted(self.ids(mmr_rerank(POOL, 50))), sorted(self.ids(POOL)))
+
+    def test_python_fallback_matches_numpy(self):
+        if reranking._numpy() is None:
+            self.skipTest('numpy is not installed')
+        for diversity in (0, 0.3, 0.7, 1):
+            expected = self.ids(mmr_rerank(POOL, 6, diversity))
+            with mock.patch.object(reranking, '_numpy', lambda: None):
+                self.assertEqual(self.ids(mmr_rerank(POOL, 6, diversity)), expected, diversity)
+
+class CandidatePoolCacheTest(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = CandidatePoolCache(max_entries=2)
+        cache.set('a', [1])
+        cache.set('b', [2])
+        cache.get('a')
+        cache.set('c', [3])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), [1])
@@ -0,0 +1,103 @@
+from models import db
+from services.tracks import TrackRecord
+from store import replace_imported_songs, replace_recommendations, upsert_imported_songs
+from tests.support import AppTestCase, make_tracks
+
+def recommendations(prefix, count):
+    return [{'id': f'{prefix}-{i}', 'title': f'Song {i}', 'artist': 'Artist', 'genre': 'Pop',
+             'tempo': 120, 'mood': 'Happy'} for i in range(count)]
+
+class DeltaSyncTest(AppTestCase):
+    def bootstrap(self, since=None, owner='default'):
+        query = {} if since is None else {'since': since}
+        response = self.client.get('/api/bootstrap', query_string=query, headers={'X-User-Id': owner})
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def write(self, mutation, *args, owner='default'):
+        mutation(owner, *args)
+        db.session.commit()
+
+    def save_playlist(self, song_ids):
+        songs = [{'id': song_id} for song_id in song_ids]
+        self.assertEqual(self.client.post('/api/stored/playlist', json={'songs': songs}).status_code, 200)
+
+    def test_snapshot_without_since(self):
+        self.write(replace_imported_songs, make_tracks('t', 2))
+        body = self.bootstrap()
+        self.assertTrue(body['full'])
+        self.assertGreater(body['version'], 0)
+        self.assertEqual([song['id'] for song in body['songs']], ['t-0', 't-1'])
+        self.assertEqual(body['recommendations'], [])
+
+    def test_replace_sends_whole_collection(self):
+        self.write(replace_imported_songs, make_tracks('t', 2))
+        version = self.bootstrap()['version']
+        self.write(replace_imported_songs, make_tracks('u', 1))
+
+        body = self.bootstrap(version)
+        self.assertFalse(body['full'])
+        songs = body['changes']['songs']
+        self.assertTrue(songs['reset'])
+        self.assertEqual([song['id'] for song in songs['upserted']], ['u-0'])
+        self.assertEqual(body['changes']['recommendations'], {'reset': False, 'upserted': [], 'deleted': []})
+
+    def test_upsert_sends_changed_rows_only(self):
+        self.write(replace_imported_songs, make_tracks('t', 3))
+        version = self.bootstrap()['version']
+        changed = TrackRecord(id='t-1', title='Renamed', artist='Artist', album='Album',
+                              genre='Pop', tempo=120, mood='Happy')
+        self.write(upsert_imported_songs, [changed] + make_tracks('n', 1))
+
+        songs = self.bootstrap(version)['changes']['songs']
+        self.assertFalse(songs['reset'])
+        self.assertEqual(sorted(song['id'] for song in songs['upserted']), ['n-0', 't-1'])
+        self.assertEqual(songs['deleted'], [])
+
+    def test_playlist_edits_are_row_changes(self):
+        self.write(replace_recommendations, recommendations('r', 4))
+        self.save_playlist(['r-0', 'r-1', 'r-2'])
+        version = self.bootstrap()['version']
+
+        self.save_playlist(['r-0', 'r-2', 'r-3'])
+        playlist = self.bootstrap(version)['changes']['playlist']
+        self.assertFalse(playlist['reset'])
+        self.assertEqual([song['id'] for song in playlist['upserted']], ['r-3'])
+        self.assertEqual(playlist['deleted'], ['r-1'])
+
+        # A reorder rewrites the playlist
+        version = self.bootstrap()['version']
+        self.save_playlist(['r-3', 'r-0'])
+        playlist = self.bootstrap(version)['changes']['playlist']
+        self.assertTrue(playlist['reset'])
+        self.assertEqual([song['id'] for song in playlist['upserted']], ['r-3', 'r-0'])
+
+    def test_replacing_recommendations_resets_playlist(self):
+        self.write(replace_recommendations, recommendations('r', 2))
+        self.save_playlist(['r-0'])
+        version = self.bootstrap()['version']
+        self.write(replace_recommendations, recommendations('r', 1))
+
+        changes = self.bootstrap(version)['changes']
+        self.assertTrue(changes['recommendations']['reset'])
+        self.assertTrue(changes['playlist']['reset'])
+        self.assertFalse(changes['songs']['reset'])
+
+    def test_versions_are_per_user(self):
+        self.write(replace_imported_songs, make_tracks('t', 2), owner='u1')
+        version = self.bootstrap(owner='u1')['version']
+        self.assertEqual(self.bootstrap(owner='u2')['version'], 0)
+
+        self.write(replace_imported_songs, make_tracks('x', 1), owner='u2')
+        body = self.bootstrap(version, owner='u1')
+        self.assertEqual(body['version'], version)
+        self.assertEqual(body['changes']['songs'], {'reset': False, 'upserted': [], 'deleted': []})
+
+    def test_since_from_the_future_gets_snapshot(self):
+        self.write(replace_imported_songs, make_tracks('t', 1))
+        body = self.bootstrap(self.bootstrap()['version'] + 100)
+        self.assertTrue(body['full'])
+        self.assertEqual(len(body['songs']), 1)
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get('/api/bootstrap?since=abc').status_code, 400)
@@ -0,0 +1,109 @@
+import unittest
+
+from models import db
+from services.taste import RunningMoments, TasteProfile
+from services.tracks import TrackRecord
+from store import load_profile, rebuild_profile, replace_imported_songs, upsert_imported_songs
+from tests.support import AppTestCase, make_tracks
+
+SONGS = [
+    {'id': 'a', 'title': 'One', 'artist': 'X', 'genre': 'Pop', 'mood': 'Happy', 'tempo': 120, 'energy': 0.8},
+    {'id': 'b', 'title': 'Two', 'artist': 'Y', 'genre': 'Rock', 'mood': 'Energetic', 'tempo': 150, 'energy': 0.9},
+    {'id': 'c', 'title': 'Three', 'artist': 'X', 'genre': 'Pop', 'mood': 'Chill', 'tempo': 0, 'energy': 0.3},
+]
+
+def add_song(profile, song, step=1):
+    update = profile.add if step > 0 else profile.remove
+    update(song['id'], song['artist'], song['genre'], song['mood'], song['tempo'], song['energy'])
+
+class RunningMomentsTest(unittest.TestCase):
+    def test_remove_undoes_add(self):
+        moments = RunningMoments()
+        for value in (1.0, 2.0, 6.0):
+            moments.add(value)
+        moments.remove(6.0)
+        self.assertEqual(moments.count, 2)
+        self.assertAlmostEqual(moments.mean, 1.5)
+        self.assertAlmostEqual(moments.variance, 0.25)
+
+    def test_remove_last_value_resets(self):
+        moments = RunningMoments()
+        moments.add(5.0)
+        moments.remove(5.0)
+        self.assertEqual((moments.count, moments.mean, moments.m2), (0, 0.0, 0.0))
+
+class TasteProfileTest(unittest.TestCase):
+    def test_summary(self):
+        summary = TasteProfile.from_songs(SONGS).summary()
+        self.assertEqual(summary['songCount'], 3)
+        self.assertEqual(summary['artistCount'], 2)
+        self.assertEqual(summary['topGenres'], ['Pop', 'Rock'])
+        self.assertEqual(summary['genreBreakdown'], {'Pop': 2, 'Rock': 1})
+        # A tempo of 0 means unknown and stays out of the average
+        self.assertEqual(summary['averageTempo'], 135)
+        self.assertAlmostEqual(summary['averageEnergy'], 0.667)
+
+    def test_add_then_remove_restores_empty_profile(self):
+        profile = TasteProfile()
+        for song in SONGS:
+            add_song(profile, song)
+        for song in reversed(SONGS):
+            add_song(profile, song, -1)
+        self.assertEqual(profile.to_json(), TasteProfile().to_json())
+
+    def test_remove_matches_profile_without_song(self):
+        profile = TasteProfile.from_songs(SONGS)
+        add_song(profile, SONGS[1], -1)
+        expected = TasteProfile.from_songs([SONGS[0], SONGS[2]])
+        self.assertEqual(profile.fingerprint, expected.fingerprint)
+        self.assertEqual(profile.summary(), expected.summary())
+
+    def test_fingerprint_ignores_order(self):
+        profile = TasteProfile.from_songs(SONGS)
+        self.assertEqual(profile.fingerprint, TasteProfile.from_songs(SONGS[::-1]).fingerprint)
+        self.assertEqual(profile.fingerprint, TasteProfile.fingerprint_of(SONGS[::-1]))
+        self.assertNotEqual(profile.fingerprint, TasteProfile.fingerprint_of(SONGS[:2]))
+
+    def test_fingerprint_falls_back_to_title_and_artist(self):
+        songs = [{'title': 'One', 'artist': 'X'}]
+        self.assertEqual(TasteProfile.from_songs(songs).fingerprint, TasteProfile.fingerprint_of(songs))
+        self.assertNotEqual(TasteProfile.fingerprint_of(songs), TasteProfile.fingerprint_of([{'title': 'One', 'artist': 'Y'}]))
+
+    def test_json_round_trip(self):
+        profile = TasteProfile.from_songs(SONGS)
+        restored = TasteProfile.from_json(profile.to_json())
+        self.assertEqual(restored.fingerprint, profile.fingerprint)
+        self.assertEqual(restored.summary(), profile.summary())
+        self.assertEqual(TasteProfile.from_json(None).song_count, 0)
+
+class StoredProfileTest(AppTestCase):
+    def assert_matches_rebuild(self, owner):
+        stored = load_profile(owner).to_json()
+        rebuild_profile(owner)
+        db.session.commit()
+        rebuilt = load_profile(owner).to_json()
+        self.assertEqual(stored['hash'], rebuilt['hash'])
+        self.assertEqual(stored['song_count'], rebuilt['song_count'])
+        self.assertEqual(stored['genres'], rebuilt['genres'])
+        self.assertEqual(stored['artists'], rebuilt['artists'])
+
+    def test_upsert_updates_profile_incrementally(self):
+        replace_imported_songs('u1', make_tracks('t', 3))
+        changed = TrackRecord(id='t-1', title='Song 1', artist='Other', album='Album',
+                              genre='Jazz', tempo=90, mood='Chill')
+        upsert_imported_songs('u1', [changed] + make_tracks('n', 2))
+        db.session.commit()
+
+        profile = load_profile('u1')
+        self.assertEqual(profile.song_count, 5)
+        self.assertEqual(profile.genres, {'Pop': 4, 'Jazz': 1})
+        self.assertEqual(profile.artists, {'Artist': 4, 'Other': 1})
+        self.assert_matches_rebuild('u1')
+
+    def test_profiles_are_per_owner(self):
+        replace_imported_songs('u1', make_tracks('t', 3))
+        replace_imported_songs('u2', make_tracks('t', 1))
+        db.session.commit()
+        self.assertEqual(load_profile('u1').song_count, 3)
+        self.assertEqual(load_profile('u2').song_count, 1)
+        self.assertEqual(load_profile('nobody').song_count, 0)
@@ -0,0 +1,69 @@
+import time
+import unittest
+from unittest import mock
+
+import write_behind
+from models import Recommendation, db
+from tests.support import AppTestCase
+from write_behind import WriteBehindQueue, coalesce
+
+def recommendations(prefix, count):
+    return [{'id': f'{prefix}-{i}', 'title': f'Song {i}', 'artist': 'Artist', 'genre': 'Pop',
+             'tempo': 120, 'mood': 'Happy'} for i in range(count)]
+
+def slowly(mutation):
+    """The mutation, delayed so readers get ahead of the writer thread"""
+    def slow(owner, payload):
+        time.sleep(0.2)
+        mutation(owner, payload)
+    return slow
+
+class CoalesceTest(unittest.TestCase):
+    def test_keeps_newest_per_owner_and_operation_in_order(self):
+        batch = [
+            (1, 'a', 'import', 'a1', None),
+            (2, 'b', 'import', 'b1', None),
+            (3, 'a', 'recommend', 'r1', None),
+            (4, 'a', 'import', 'a2', None),
+        ]
+        self.assertEqual([write[0] for write in coalesce(batch)], [2, 3, 4])
+
+class WriteBehindTest(AppTestCase):
+    config = {'WRITE_BEHIND': True}
+
+    def setUp(self):
+        super().setUp()
+        self.queue = self.app.extensions['musicai'].get('write_behind')
+
+    def stored_ids(self, owner='default'):
+        return db.session.execute(
+            db.select(Recommendation.id).where(Recommendation.owner == owner).order_by(Recommendation.id)
+        ).scalars().all()
+
+    def test_reads_wait_for_queued_writes(self):
+        slow = {operation: slowly(mutation) for operation, mutation in write_behind.MUTATIONS.items()}
+        with mock.patch.dict(write_behind.MUTATIONS, slow):
+            self.assertTrue(self.queue.submit('default', 'recommend', recommendations('r', 3)))
+            body = self.client.get('/api/stored/recommendations').get_json()
+            self.assertEqual(len(body['recommendations']), 3)
+
+            playlist = recommendations('r', 2)
+            self.assertEqual(self.client.post('/api/stored/playlist', json={'songs': playlist}).status_code, 200)
+            songs = self.client.get('/api/stored/playlist').get_json()['songs']
+            self.assertEqual([song['id'] for song in songs], ['r-0', 'r-1'])
+
+    def test_newer_write_replaces_queued_one(self):
+        committed = []
+        # Keep the writer from taking the queue until both writes are in it
+        with self.queue._commit_lock:
+            self.queue.submit('default', 'recommend', recommendations('old', 2), lambda: committed.append('old'))
+            self.queue.submit('default', 'recommend', recommendations('new', 1), lambda: committed.append('new'))
+        self.assertTrue(self.queue.flush('default', 5))
+        self.assertEqual(self.stored_ids(), ['new-0'])
+        self.assertEqual(committed, ['new'])
+
+    def test_full_queue_commits_synchronously(self):
+        queue = WriteBehindQueue(self.app, max_pending=0)
+        self.assertFalse(queue.submit('u1', 'recommend', recommendations('r', 2)))
+        self.assertEqual(queue.pending, 0)
+        self.assertEqual(self.stored_ids('u1'), ['r-0', 'r-1'])
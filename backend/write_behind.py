@@ -0,0 +1,181 @@
+"""
+Write-behind persistence of the stored collections
+
+When enabled (WRITE_BEHIND), the import, recommend and built playlist
+endpoints hand their store mutation to a writer thread and respond without
+waiting for the SQLite commit. The writer drains the queue in batches: every
+mutation replaces a whole collection of one owner, so only the newest one
+per owner and collection in a batch is applied, and the batch is committed
+as one transaction. While a commit is running new mutations keep queueing,
+so a burst of requests is written with a few commits instead of one each.
+
+Readers that must see earlier writes call flush(owner), a barrier that
+waits until everything the owner submitted so far is committed. The barrier
+covers writes submitted in this process only.
+
+When the queue is full the caller commits synchronously instead, taking the
+queued mutations along so they are never applied after a newer one.
+"""
+
+import atexit
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import db
+from services.metrics import DB_WRITE_DURATION, WRITE_BEHIND_WRITES
+from store import replace_imported_songs, replace_recommendations, replace_built_playlist
+
+# Store mutation(owner, payload) per operation (also the DB_WRITE_DURATION label)
+MUTATIONS = {
+    'import': replace_imported_songs,
+    'recommend': replace_recommendations,
+    'built_playlist': replace_built_playlist,
+}
+
+# (sequence number, owner, operation, payload, callback run after the commit)
+PendingWrite = Tuple[int, str, str, object, Optional[Callable]]
+
+def apply_write(owner: str, operation: str, payload, on_commit: Optional[Callable] = None):
+    """Apply one mutation and commit it in the current session"""
+    with DB_WRITE_DURATION.time(operation):
+        MUTATIONS[operation](owner, payload)
+        db.session.commit()
+    if on_commit is not None:
+        on_commit()
+
+def coalesce(batch: List[PendingWrite]) -> List[PendingWrite]:
+    """Keep the newest mutation per owner and operation, in submission order"""
+    newest: Dict[Tuple[str, str], PendingWrite] = {}
+    for write in batch:
+        newest[write[1], write[2]] = write
+    return sorted(newest.values(), key=lambda write: write[0])
+
+class WriteBehindQueue:
+    """Bounded queue of store mutations committed in batches by one writer thread"""
+
+    def __init__(self, app, max_pending: int = 64, flush_timeout: float = 30.0):
+        """
+        Args:
+            app: Flask app (the writer commits through its database)
+            max_pending: Queued mutations before callers fall back to committing themselves
+            flush_timeout: How long the exit handler waits for queued writes
+        """
+        self.app = app
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        self._submitted = 0
+        self._committed = 0
+        # Sequence number of each owner's newest write not yet committed
+        self._owner_submitted: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        # Held while a batch is taken from the queue and committed, so batches
+        # (the writer's and synchronous fallbacks) commit in submission order
+        self._commit_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, None, flush_timeout)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def submit(self, owner: str, operation: str, payload, on_commit: Optional[Callable] = None) -> bool:
+        """
+        Queue a mutation, or commit it right away when the queue is full
+
+        Args:
+            owner: Partition the mutation writes to
+            operation: Key of MUTATIONS
+            payload: Argument of the mutation
+            on_commit: Called (in an app context) once the mutation is committed;
+                not called if a newer mutation of the same owner and operation replaces it
+
+        Returns:
+            True if the mutation was queued, False if it was committed synchronously
+        """
+        with self._cond:
+            if len(self._pending) < self.max_pending:
+                self._pending.append(self._next_write(owner, operation, payload, on_commit))
+                self._cond.notify_all()
+                WRITE_BEHIND_WRITES.inc(operation, 'queued')
+                return True
+
+        WRITE_BEHIND_WRITES.inc(operation, 'sync')
+        with self._commit_lock:
+            # Numbered under the commit lock: everything queued so far is older and goes first
+            with self._cond:
+                batch = self._take() + [self._next_write(owner, operation, payload, on_commit)]
+            self._commit(batch)
+        return False
+
+    def flush(self, owner: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every mutation of `owner` (of anyone if None) submitted
+        before the call is committed
+
+        Returns:
+            False if the timeout expired first
+        """
+        with self._cond:
+            target = self._submitted if owner is None else self._owner_submitted.get(owner, 0)
+            return self._cond.wait_for(lambda: self._committed >= target, timeout)
+
+    def _next_write(self, owner: str, operation: str, payload, on_commit: Optional[Callable]) -> PendingWrite:
+        self._submitted += 1
+        self._owner_submitted[owner] = self._submitted
+        return (self._submitted, owner, operation, payload, on_commit)
+
+    def _take(self) -> List[PendingWrite]:
+        with self._cond:
+            batch = list(self._pending)
+            self._pending.clear()
+            return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+            with self._commit_lock:
+                batch = self._take()
+                if batch:
+                    with self.app.app_context():
+                        self._commit(batch)
+
+    def _commit(self, batch: List[PendingWrite]):
+        """Apply a batch in one transaction (one per mutation if that fails)"""
+        writes = coalesce(batch)
+        try:
+            try:
+                with DB_WRITE_DURATION.time('write_behind_batch'):
+                    for _, owner, operation, payload, _ in writes:
+                        MUTATIONS[operation](owner, payload)
+                    db.session.commit()
+                callbacks = [on_commit for *_, on_commit in writes if on_commit is not None]
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error committing write-behind batch, retrying writes one by one: {str(e)}")
+                callbacks = []
+                for _, owner, operation, payload, on_commit in writes:
+                    try:
+                        apply_write(owner, operation, payload)
+                        if on_commit is not None:
+                            callbacks.append(on_commit)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Error committing {operation} write: {str(e)}")
+
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Error in write-behind commit callback: {str(e)}")
+        finally:
+            # Failed writes are released too, so readers never wait on them forever
+            with self._cond:
+                self._committed = max(self._committed, writes[-1][0])
+                for _, owner, *_ in batch:
+                    if self._owner_submitted.get(owner, 0) <= self._committed:
+                        self._owner_submitted.pop(owner, None)
+                self._cond.notify_all()
@@ -1,7 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Music, Plus, X, Play, ThumbsUp, Filter, TrendingUp, BarChart3, Users } from 'lucide-react';
 import './App.css';
-import { importPlaylist, generateRecommendations, calculateStats, fetchStoredImportedSongs, fetchStoredRecommendations, fetchStoredPlaylist } from './api';
+import { importPlaylist, generateRecommendations, calculateStats, fetchBootstrap, applyChanges, saveBuiltPlaylist } from './api';
 
 function App() {
   // State management
@@ -19,6 +19,8 @@ function App() {
     genre: 'all',
     era: 'all'
   });
+  // Change version of the last bootstrap, for delta syncs
+  const syncVersion = useRef(null);
 
   // Using actual data from API
 
@@ -73,32 +75,34 @@ const handleCalculateStats = async () => {
   }
 };
 
-  // Load stored data when app starts
+  // Load stored data when app starts, then pick up changes made elsewhere
+  // (another tab, a bulk import) whenever the window regains focus
   useEffect(() => {
-    const loadStoredData = async () => {
+    const syncStoredData = async () => {
       try {
-        // Fetch all stored data in parallel
-        const [importedData, recommendationsData, playlistData] = await Promise.all([
-          fetchStoredImportedSongs(),
-          fetchStoredRecommendations(),
-          fetchStoredPlaylist()
-        ]);
-
-        if (importedData.success) {
-          setImportedSongs(importedData.songs);
-        }
-        if (recommendationsData.success) {
-          setRecommendations(recommendationsData.recommendations);
+        const data = await fetchBootstrap(syncVersion.current);
+        if (!data.success) {
+          return;
         }
-        if (playlistData.success) {
-          setBuiltPlaylist(playlistData.songs);
+
+        if (data.full) {
+          setImportedSongs(data.songs);
+          setRecommendations(data.recommendations);
+          setBuiltPlaylist(data.playlist);
+        } else {
+          setImportedSongs(songs => applyChanges(songs, data.changes.songs));
+          setRecommendations(recs => applyChanges(recs, data.changes.recommendations));
+          setBuiltPlaylist(playlist => applyChanges(playlist, data.changes.playlist));
         }
+        syncVersion.current = data.version;
       } catch (error) {
         console.error('Error loading stored data:', error);
       }
     };
 
-    loadStoredData();
+    syncStoredData();
+    window.addEventListener('focus', syncStoredData);
+    return () => window.removeEventListener('focus', syncStoredData);
   }, []);
 
   useEffect(() => {
@@ -109,13 +113,7 @@ const handleCalculateStats = async () => {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [activeTab, recommendations]);  const savePlaylistToServer = async (updatedPlaylist) => {
     try {
-      const response = await fetch('http://127.0.0.1:5000/api/stored/playlist', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ songs: updatedPlaylist }),
-      });
+      const response = await saveBuiltPlaylist(updatedPlaylist);
       if (!response.ok) {
         console.error('Failed to save playlist to server');
       }
@@ -1,11 +1,31 @@
 const API_BASE_URL = 'http://127.0.0.1:5000/api';
 
+// The backend keeps stored data per user. Each browser gets a random id
+// once and sends it with every request.
+const USER_ID_KEY = 'musicaiUserId';
+
+const getUserId = () => {
+  let userId = localStorage.getItem(USER_ID_KEY);
+  if (!userId) {
+    userId = window.crypto && window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem(USER_ID_KEY, userId);
+  }
+  return userId;
+};
+
+const requestHeaders = (headers = {}) => ({
+  'X-User-Id': getUserId(),
+  ...headers,
+});
+
 export const importPlaylist = async (playlistUrl) => {
   const response = await fetch(`${API_BASE_URL}/import`, {
     method: 'POST',
-    headers: {
+    headers: requestHeaders({
       'Content-Type': 'application/json',
-    },
+    }),
     body: JSON.stringify({ playlistUrl }),
   });
   return response.json();
@@ -14,9 +34,9 @@ export const importPlaylist = async (playlistUrl) => {
 export const generateRecommendations = async (songs) => {
   const response = await fetch(`${API_BASE_URL}/recommend`, {
     method: 'POST',
-    headers: {
+    headers: requestHeaders({
       'Content-Type': 'application/json',
-    },
+    }),
     body: JSON.stringify({ songs }),
   });
   return response.json();
@@ -25,25 +45,55 @@ export const generateRecommendations = async (songs) => {
 export const calculateStats = async (originalSongs, recommendations) => {
   const response = await fetch(`${API_BASE_URL}/stats`, {
     method: 'POST',
-    headers: {
+    headers: requestHeaders({
       'Content-Type': 'application/json',
-    },
+    }),
     body: JSON.stringify({ originalSongs, recommendations }),
   });
   return response.json();
 };
 
-export const fetchStoredImportedSongs = async () => {
-  const response = await fetch(`${API_BASE_URL}/stored/imported`);
+// All stored state in one request. Pass the version of the last sync as
+// `since` to receive only the changes made after it.
+export const fetchBootstrap = async (since) => {
+  const query = since === undefined || since === null ? '' : `?since=${since}`;
+  const response = await fetch(`${API_BASE_URL}/bootstrap${query}`, {
+    headers: requestHeaders(),
+  });
   return response.json();
 };
 
-export const fetchStoredRecommendations = async () => {
-  const response = await fetch(`${API_BASE_URL}/stored/recommendations`);
-  return response.json();
+// Merge one collection's changes from a delta bootstrap into a list
+export const applyChanges = (items, change) => {
+  if (!change) {
+    return items;
+  }
+  if (change.reset) {
+    return change.upserted;
+  }
+  const deleted = new Set(change.deleted);
+  const upserted = new Map(change.upserted.map(item => [item.id, item]));
+  const merged = items
+    .filter(item => !deleted.has(item.id))
+    .map(item => {
+      const updated = upserted.get(item.id);
+      if (updated) {
+        upserted.delete(item.id);
+        return updated;
+      }
+      return item;
+    });
+  // Anything left is new and goes after the existing rows
+  return [...merged, ...upserted.values()];
 };
 
-export const fetchStoredPlaylist = async () => {
-  const response = await fetch(`${API_BASE_URL}/stored/playlist`);
-  return response.json();
-};
\ No newline at end of file
+export const saveBuiltPlaylist = async (songs) => {
+  const response = await fetch(`${API_BASE_URL}/stored/playlist`, {
+    method: 'POST',
+    headers: requestHeaders({
+      'Content-Type': 'application/json',
+    }),
+    body: JSON.stringify({ songs }),
+  });
+  return response;
+};